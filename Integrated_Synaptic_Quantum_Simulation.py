@@ -3,49 +3,367 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import random
 from PIL import Image
-import os
-import io
-
-from qiskit import QuantumCircuit, transpile
-from qiskit_aer import AerSimulator
-from qiskit.visualization import plot_bloch_multivector
-
-# Initialize synaptic network
-def init_synaptic_network(n_neurons):
-    G = nx.erdos_renyi_graph(n_neurons, p=0.3)
-    for (u, v) in G.edges():
-        G[u][v]['weight'] = np.random.rand()
-    return G
-
-# Update synaptic connections
-def update_synapses(G, prune_prob=0.1, form_prob=0.05):
-    edges_to_remove = []
-    for u, v in list(G.edges()):
-        if np.random.rand() < prune_prob:
-            edges_to_remove.append((u, v))
-    G.remove_edges_from(edges_to_remove)
-    nodes = list(G.nodes())
-    for _ in range(len(nodes)):
-        u, v = random.sample(nodes, 2)
-        if not G.has_edge(u, v) and np.random.rand() < form_prob:
-            G.add_edge(u, v, weight=np.random.rand())
-    return G
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import hashlib
+import subprocess
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Qiskit is imported lazily: the NumPy backend below runs without it, and
+# the qiskit/qiskit_aer import alone costs seconds of startup
+
+# Compact synapse store: undirected edges as (src < dst) int32 arrays with float32 weights
+class SynapseStore:
+    def __init__(self, n_neurons, src, dst, weight):
+        self.n_neurons = n_neurons
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self.weight = np.asarray(weight, dtype=np.float32)
+
+    def keys(self):
+        # Canonical int64 key per undirected edge
+        return self.src.astype(np.int64) * self.n_neurons + self.dst
+
+    def number_of_nodes(self):
+        return self.n_neurons
+
+    def number_of_edges(self):
+        return len(self.src)
+
+    def degrees(self):
+        return (np.bincount(self.src, minlength=self.n_neurons) +
+                np.bincount(self.dst, minlength=self.n_neurons))
+
+    def to_csr(self):
+        # Symmetric CSR view (indptr, indices, weights) for sparse matvecs
+        rows = np.concatenate([self.src, self.dst])
+        cols = np.concatenate([self.dst, self.src])
+        data = np.concatenate([self.weight, self.weight])
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(self.n_neurons + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.n_neurons), out=indptr[1:])
+        return indptr, cols[order], data[order]
+
+    def to_networkx(self):
+        G = nx.Graph()
+        G.add_nodes_from(range(self.n_neurons))
+        G.add_weighted_edges_from(zip(self.src.tolist(), self.dst.tolist(), self.weight.tolist()))
+        return G
+
+# Drop repeated keys from a sorted key array
+def _unique_sorted(keys):
+    if len(keys) == 0:
+        return keys
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+
+# Sample distinct undirected pairs (u < v) as sorted int64 keys
+def _sample_edge_keys(n_neurons, n_edges, rng):
+    keys = np.empty(0, dtype=np.int64)
+    while len(keys) < n_edges:
+        draw = int((n_edges - len(keys)) * 1.05) + 16
+        u = rng.integers(0, n_neurons, draw)
+        v = rng.integers(0, n_neurons, draw)
+        valid = u != v
+        lo, hi = np.minimum(u, v)[valid], np.maximum(u, v)[valid]
+        keys = np.concatenate([keys, lo * n_neurons + hi])
+        keys.sort()
+        keys = _unique_sorted(keys)
+    if len(keys) > n_edges:
+        keys = np.sort(keys[rng.permutation(len(keys))[:n_edges]])
+    return keys
+
+# Draw candidate pairs in one batch; return sorted keys of accepted pairs not in `keys`
+def _form_synapse_keys(keys, n_neurons, n_candidates, form_prob, rng):
+    u = rng.integers(0, n_neurons, n_candidates)
+    v = (u + rng.integers(1, n_neurons, n_candidates)) % n_neurons
+    accept = rng.random(n_candidates) < form_prob
+    lo, hi = np.minimum(u, v)[accept], np.maximum(u, v)[accept]
+    candidates = lo.astype(np.int64) * n_neurons + hi
+    candidates.sort()
+    candidates = _unique_sorted(candidates)
+    return candidates[~_isin_sorted(candidates, keys)]
+
+# Sorted-key index probe: which `values` are present in the sorted `keys`
+def _isin_sorted(values, keys):
+    if len(keys) == 0:
+        return np.zeros(len(values), dtype=bool)
+    at = np.searchsorted(keys, values)
+    return keys[np.minimum(at, len(keys) - 1)] == values
+
+# Initialize array-backed synaptic network (Erdos-Renyi G(n, p); avg_degree sets p = avg_degree / (n - 1))
+def init_synapse_store(n_neurons, p=0.3, avg_degree=None, rng=None):
+    rng = rng or np.random.default_rng()
+    if avg_degree is not None:
+        p = avg_degree / max(n_neurons - 1, 1)
+    n_pairs = n_neurons * (n_neurons - 1) // 2
+    if n_pairs <= 5_000_000:
+        # Small networks: test every pair once
+        src, dst = np.triu_indices(n_neurons, k=1)
+        mask = rng.random(n_pairs) < p
+        src, dst = src[mask], dst[mask]
+    else:
+        # Large sparse networks: draw the edge count, then sample distinct pairs
+        keys = _sample_edge_keys(n_neurons, rng.binomial(n_pairs, p), rng)
+        src, dst = np.divmod(keys, n_neurons)
+    weight = rng.random(len(src), dtype=np.float32)
+    return SynapseStore(n_neurons, src, dst, weight)
+
+# Update array-backed synaptic connections (pruning is a single boolean mask)
+def update_synapse_store(store, prune_prob=0.1, form_prob=0.05, rng=None):
+    rng = rng or np.random.default_rng()
+    keep = rng.random(store.number_of_edges()) >= prune_prob
+    store.src, store.dst, store.weight = store.src[keep], store.dst[keep], store.weight[keep]
+
+    # Formation: one candidate pair per neuron, accepted with form_prob if not already connected
+    n = store.n_neurons
+    keys = store.keys()
+    new_keys = _form_synapse_keys(keys, n, n, form_prob, rng)
+    # Bulk sorted insert keeps the store ordered by key
+    at = np.searchsorted(keys, new_keys)
+    new_src, new_dst = np.divmod(new_keys, n)
+    store.src = np.insert(store.src, at, new_src.astype(np.int32))
+    store.dst = np.insert(store.dst, at, new_dst.astype(np.int32))
+    store.weight = np.insert(store.weight, at, rng.random(len(new_keys), dtype=np.float32))
+    return store
+
+# Delta-encoded history of a SynapseStore. Full (keys, weight) arrays are kept only at keyframes
+# (every keyframe_every steps); every step records its removed keys, added (key, weight) pairs and
+# changed weights. Edge count, mean weight and the degree histogram are updated from the deltas,
+# without ever rebuilding a graph. Call record(store) once per step after the store has changed.
+class SynapseHistory:
+    def __init__(self, store, keyframe_every=10):
+        self.n_neurons = store.n_neurons
+        self.keyframe_every = keyframe_every
+        self._keys, self._weight = store.keys(), store.weight.copy()
+        self.keyframes = {0: (self._keys, self._weight.copy())}
+        empty_keys, empty_weight = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        self.removed = [empty_keys]
+        self.added = [empty_keys]
+        self.added_weight = [empty_weight]
+        self.changed = [empty_keys]
+        self.changed_weight = [empty_weight]
+        self._degrees = store.degrees()
+        self._histogram = np.bincount(self._degrees)
+        self._weight_sum = float(self._weight.sum(dtype=np.float64))
+        self.edge_count = [len(self._keys)]
+        self.mean_weight = [self._weight_sum / max(len(self._keys), 1)]
+        self.degree_histograms = [self._histogram.copy()]
+
+    def __len__(self):
+        return len(self.edge_count)
+
+    def record(self, store):
+        keys, weight = store.keys(), store.weight
+        kept = _isin_sorted(self._keys, keys)
+        old = _isin_sorted(keys, self._keys)
+        old_weight, new_weight = self._weight[kept], weight[old]
+        changed = old_weight != new_weight
+        self.removed.append(self._keys[~kept])
+        self.added.append(keys[~old])
+        self.added_weight.append(weight[~old].copy())
+        self.changed.append(keys[old][changed])
+        self.changed_weight.append(new_weight[changed])
+
+        self._weight_sum += (self.added_weight[-1].sum(dtype=np.float64) -
+                             self._weight[~kept].sum(dtype=np.float64) +
+                             (new_weight[changed] - old_weight[changed]).sum(dtype=np.float64))
+        self._update_degrees(self.removed[-1], self.added[-1])
+        self.edge_count.append(len(keys))
+        self.mean_weight.append(self._weight_sum / max(len(keys), 1))
+        self.degree_histograms.append(self._histogram.copy())
+
+        self._keys, self._weight = keys, weight.copy()
+        if (len(self) - 1) % self.keyframe_every == 0:
+            self.keyframes[len(self) - 1] = (self._keys, self._weight.copy())
+
+    # Move only the touched neurons between degree histogram bins
+    def _update_degrees(self, removed, added):
+        endpoints = np.concatenate(np.divmod(removed, self.n_neurons) + np.divmod(added, self.n_neurons))
+        if len(endpoints) == 0:
+            return
+        sign = np.repeat([-1, -1, 1, 1], [len(removed), len(removed), len(added), len(added)])
+        order = np.argsort(endpoints, kind='stable')
+        endpoints, sign = endpoints[order], sign[order]
+        nodes = _unique_sorted(endpoints)
+        delta = np.bincount(np.searchsorted(nodes, endpoints), weights=sign).astype(np.int64)
+        before = self._degrees[nodes]
+        after = before + delta
+        if after.max() >= len(self._histogram):
+            self._histogram = np.pad(self._histogram, (0, after.max() + 1 - len(self._histogram)))
+        np.subtract.at(self._histogram, before, 1)
+        np.add.at(self._histogram, after, 1)
+        self._degrees[nodes] = after
+
+    # Degree histogram (count of neurons per degree) at `step`
+    def degree_distribution(self, step):
+        return self.degree_histograms[step]
+
+    # Rebuild the store at `step` from the nearest keyframe at or before it
+    def reconstruct(self, step):
+        if not 0 <= step < len(self):
+            raise IndexError(f"Step {step} not recorded (history has {len(self)} steps)")
+        base = step - step % self.keyframe_every
+        keys, weight = self.keyframes[base]
+        keys, weight = keys.copy(), weight.copy()
+        for t in range(base + 1, step + 1):
+            keep = ~_isin_sorted(keys, self.removed[t])
+            keys, weight = keys[keep], weight[keep]
+            at = np.searchsorted(keys, self.added[t])
+            keys = np.insert(keys, at, self.added[t])
+            weight = np.insert(weight, at, self.added_weight[t])
+            weight[np.searchsorted(keys, self.changed[t])] = self.changed_weight[t]
+        src, dst = np.divmod(keys, self.n_neurons)
+        return SynapseStore(self.n_neurons, src, dst, weight)
+
+    def arrays(self):
+        out = {'n_neurons': self.n_neurons, 'keyframe_every': self.keyframe_every,
+               'edge_count': np.array(self.edge_count), 'mean_weight': np.array(self.mean_weight)}
+        # Ragged per-step arrays are stored flat with offsets
+        for name in ('removed', 'added', 'added_weight', 'changed', 'changed_weight'):
+            parts = getattr(self, name)
+            out[name] = np.concatenate(parts)
+            out[name + '_offsets'] = np.cumsum([0] + [len(p) for p in parts])
+        width = max(len(h) for h in self.degree_histograms)
+        out['degree_histograms'] = np.array([np.pad(h, (0, width - len(h))) for h in self.degree_histograms])
+        steps = sorted(self.keyframes)
+        out['keyframe_steps'] = np.array(steps)
+        out['keyframe_keys'] = np.concatenate([self.keyframes[t][0] for t in steps])
+        out['keyframe_weight'] = np.concatenate([self.keyframes[t][1] for t in steps])
+        out['keyframe_offsets'] = np.cumsum([0] + [len(self.keyframes[t][0]) for t in steps])
+        return out
+
+    def save(self, path='synapse_history.npz'):
+        np.savez_compressed(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        split = lambda name, offsets=None: np.split(data[name], data[offsets or name + '_offsets'][1:-1])
+        history = cls.__new__(cls)
+        history.n_neurons = int(data['n_neurons'])
+        history.keyframe_every = int(data['keyframe_every'])
+        for name in ('removed', 'added', 'added_weight', 'changed', 'changed_weight'):
+            setattr(history, name, split(name))
+        history.edge_count = data['edge_count'].tolist()
+        history.mean_weight = data['mean_weight'].tolist()
+        history.degree_histograms = list(data['degree_histograms'])
+        history.keyframes = dict(zip(data['keyframe_steps'].tolist(),
+                                     zip(split('keyframe_keys', 'keyframe_offsets'),
+                                         split('keyframe_weight', 'keyframe_offsets'))))
+        # Restore the running state so recording can continue
+        last = history.reconstruct(len(history) - 1)
+        history._keys, history._weight = last.keys(), last.weight.copy()
+        history._degrees = last.degrees()
+        history._histogram = np.bincount(history._degrees)
+        history._weight_sum = float(history._weight.sum(dtype=np.float64))
+        return history
+
+# Neuronal dynamics on a SynapseStore: model='lif' integrates leaky integrate-and-fire neurons,
+# model='rate' sigmoid rate units. Synaptic input is a sparse weighted matvec over the undirected
+# edge arrays (one bincount per direction, no adjacency matrix is built); plasticity is vectorized
+# per edge and clipped to [0, w_max]. LIF uses a trace-based STDP rule: a spike potentiates its
+# synapses by the partner's recent-spike trace and depresses them in proportion to their weight.
+# Rate units use Oja-style Hebbian learning. `rate` is the per-neuron activity (EWMA spikes/step for LIF).
+class NeuralDynamics:
+    def __init__(self, n_neurons, model='lif', dt=1.0, tau=20.0, threshold=1.0, reset=0.0, drive=0.9,
+                 noise=0.3, gain=1.0, slope=5.0, tau_trace=20.0, a_plus=0.01, a_minus=0.005,
+                 learning_rate=0.01, w_max=1.0, rng=None):
+        if model not in ('lif', 'rate'):
+            raise ValueError(f"Unknown neuron model {model!r}")
+        self.n_neurons = n_neurons
+        self.model = model
+        self.dt, self.tau, self.threshold, self.reset = dt, tau, threshold, reset
+        self.drive, self.noise, self.gain, self.slope = drive, noise, gain, slope
+        self.trace_decay = np.float32(np.exp(-dt / tau_trace))
+        self.a_plus, self.a_minus = a_plus, a_minus
+        self.learning_rate, self.w_max = learning_rate, w_max
+        self.rng = rng or np.random.default_rng()
+        self.v = np.zeros(n_neurons, dtype=np.float32)
+        self.trace = np.zeros(n_neurons, dtype=np.float32)
+        self.spikes = np.zeros(n_neurons, dtype=bool)
+        self.rate = np.zeros(n_neurons, dtype=np.float32)
+        self.spike_count = 0
+
+    # Weighted undirected matvec W @ x straight from the edge arrays
+    def propagate(self, store, x):
+        n = self.n_neurons
+        w = store.weight
+        return (np.bincount(store.src, weights=w * x[store.dst], minlength=n) +
+                np.bincount(store.dst, weights=w * x[store.src], minlength=n)).astype(np.float32)
+
+    def _noise(self):
+        return self.noise * np.sqrt(self.dt / self.tau) * self.rng.standard_normal(self.n_neurons, dtype=np.float32)
+
+    def _step_lif(self, store, plasticity, gain):
+        # Spikes are sparse: only synapses touching a neuron that fired last step carry input or learn
+        s_src, s_dst = self.spikes[store.src], self.spikes[store.dst]
+        active = np.flatnonzero(s_src | s_dst)
+        synaptic = np.zeros(self.n_neurons, dtype=np.float32)
+        if len(active):
+            u, v, w = store.src[active], store.dst[active], store.weight[active]
+            s_u, s_v = s_src[active], s_dst[active]
+            synaptic += np.bincount(u, weights=w * s_v, minlength=self.n_neurons).astype(np.float32)
+            synaptic += np.bincount(v, weights=w * s_u, minlength=self.n_neurons).astype(np.float32)
+            if plasticity:
+                dw = (self.a_plus * (s_u * self.trace[v] + s_v * self.trace[u]) -
+                      self.a_minus * (s_u.astype(np.float32) + s_v) * w)
+                store.weight[active] = np.clip(w + dw, 0.0, self.w_max)
+        self.v += self.dt / self.tau * (self.drive - self.v) + gain * synaptic + self._noise()
+        self.spikes = self.v >= self.threshold
+        self.v[self.spikes] = self.reset
+        self.trace *= self.trace_decay
+        self.trace[self.spikes] += 1.0
+        self.rate += (self.dt / self.tau) * (self.spikes - self.rate)
+        self.spike_count += int(self.spikes.sum())
+
+    def _step_rate(self, store, plasticity, gain):
+        x = self.drive + gain * self.propagate(store, self.rate) + self._noise()
+        target = 1.0 / (1.0 + np.exp(-self.slope * (x - self.threshold)))
+        self.rate += self.dt / self.tau * (target - self.rate)
+        if plasticity:
+            ru, rv = self.rate[store.src], self.rate[store.dst]
+            dw = self.learning_rate * self.dt * (ru * rv - 0.5 * (ru * ru + rv * rv) * store.weight)
+            np.clip(store.weight + dw, 0.0, self.w_max, out=store.weight)
+
+    # Advance n_steps of dt; weights in `store` are updated in place when plasticity is on
+    def step(self, store, n_steps=1, plasticity=True):
+        if len(self.rate) < store.n_neurons:
+            raise ValueError("SynapseStore has more neurons than the dynamics engine")
+        advance = self._step_lif if self.model == 'lif' else self._step_rate
+        # gain is per mean degree, so the same settings hold from toy graphs to millions of synapses
+        gain = self.gain / max(2.0 * store.number_of_edges() / store.n_neurons, 1.0)
+        for _ in range(n_steps):
+            advance(store, plasticity, gain)
+        return self.rate
+
+# Mean activity of n_groups contiguous neuron blocks (one block per qubit)
+def group_activity(rate, n_groups):
+    group = np.arange(len(rate)) * n_groups // max(len(rate), 1)
+    return np.bincount(group, weights=rate, minlength=n_groups) / np.maximum(np.bincount(group, minlength=n_groups), 1)
 
 # Reconfigure quantum gates
-def quantum_gate_reconfig(n_qubits, current_gates):
+# activity (one value per qubit, e.g. group_activity) biases new gates towards the qubits whose
+# neuron groups are most active
+def quantum_gate_reconfig(n_qubits, current_gates, activity=None):
     new_gates = []
     for gate in current_gates:
         if np.random.rand() < 0.2:
             continue
         new_gates.append(gate)
     for _ in range(np.random.randint(1, 3)):
-        qubits = random.sample(range(n_qubits), 2)
+        if activity is None:
+            qubits = random.sample(range(n_qubits), 2)
+        else:
+            p = np.asarray(activity, dtype=float) + 1e-3
+            qubits = np.random.choice(n_qubits, 2, replace=False, p=p / p.sum()).tolist()
         gate_type = random.choice(['CX', 'RY', 'H'])
         new_gates.append((gate_type, qubits))
     return new_gates
 
 # Build Qiskit circuit
 def build_quantum_circuit_from_gates(gate_list, num_qubits=5):
+    from qiskit import QuantumCircuit
+    import qiskit_aer  # registers QuantumCircuit.save_statevector
     qc = QuantumCircuit(num_qubits)
     for gate, qubits in gate_list:
         if any(q >= num_qubits for q in qubits):
@@ -67,131 +385,694 @@ def build_quantum_circuit_from_gates(gate_list, num_qubits=5):
     qc.save_statevector()
     return qc
 
-# Plot synaptic network individually
-def plot_synaptic_graph(G, time_step):
-    plt.figure()
-    pos = nx.spring_layout(G, seed=42)
-    weights = [G[u][v]['weight'] for u, v in G.edges()]
-    nx.draw(G, pos, with_labels=True, edge_color=weights, edge_cmap=plt.cm.Blues)
-    num_nodes = G.number_of_nodes()
-    num_edges = G.number_of_edges()
-    description = f'Neurons: {num_nodes}\nSynapses: {num_edges}\nTime Step: {time_step}'
-    plt.title("Synaptic Network")
-    plt.text(0.02, 0.95, description, transform=plt.gca().transAxes, fontsize=8,
-             verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
-    plt.savefig(f'synaptic_t{time_step}.png', bbox_inches='tight')
-    plt.close()
-
-# Plot quantum circuit individually
-def plot_quantum_circuit(qc, time_step):
-    plt.figure()
-    qc.draw(output='mpl')
-    num_qubits = qc.num_qubits
-    num_gates = len(qc.data)
-    description = f'Qubits: {num_qubits}\nGates: {num_gates}\nTime Step: {time_step}'
-    plt.title("Quantum Circuit")
-    plt.text(0.02, 0.95, description, transform=plt.gca().transAxes, fontsize=8,
-             verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
-    plt.savefig(f'circuit_t{time_step}.png', bbox_inches='tight')
-    plt.close()
-
-# Plot Bloch sphere individually
-def plot_bloch_sphere(statevector, time_step):
-    plt.figure()
-    plot_bloch_multivector(statevector)
-    num_qubits = statevector.num_qubits
-    description = f'Qubits: {num_qubits}\nTime Step: {time_step}'
-    plt.title("Bloch Sphere")
-    plt.gca().text2D(0.02, 0.95, description, transform=plt.gca().transAxes, fontsize=8,
-                     verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
-    plt.savefig(f'bloch_t{time_step}.png', bbox_inches='tight')
-    plt.close()
-
-# Plot combined figure
-def plot_combined(G, qc, statevector, title, time_step):
-    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5), gridspec_kw={'width_ratios': [1, 1.5, 1]})
-    
-    # Synaptic network
-    pos = nx.spring_layout(G, seed=42)
+# Gate matrices for the reconfigurable gate set
+H_GATE = np.array([[1, 1], [1, -1]], dtype=complex) / np.sqrt(2)
+Z_GATE = np.array([[1, 0], [0, -1]], dtype=complex)
+
+def ry_gate(theta):
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=complex)
+
+RY_GATE = ry_gate(1.57)
+
+# Apply a single-qubit gate to a (..., 2, ..., 2) state tensor; qubit q is axis -(q+1) (Qiskit ordering),
+# so leading batch axes are carried along
+def apply_single_qubit_gate(state, matrix, q):
+    return (matrix @ state.reshape(-1, 2, 2 ** q)).reshape(state.shape)
+
+# Apply CX in place: swap target amplitudes inside the control=1 slice
+def apply_cx(state, control, target):
+    n = state.ndim
+    index = [slice(None)] * n
+    index[n - 1 - control] = 1
+    sub = state[tuple(index)]
+    target_axis = n - 1 - target
+    if target_axis > n - 1 - control:
+        target_axis -= 1
+    sub[...] = np.flip(sub, axis=target_axis).copy()
+    return state
+
+# Apply CZ in place: negate amplitudes where both qubits are 1
+def apply_cz(state, a, b):
+    n = state.ndim
+    index = [slice(None)] * n
+    index[n - 1 - a] = 1
+    index[n - 1 - b] = 1
+    state[tuple(index)] *= -1
+    return state
+
+# Apply one (gate, qubits) entry with the same semantics as build_quantum_circuit_from_gates
+def apply_gate(state, gate, qubits):
+    if gate == "H":
+        for q in qubits:
+            state = apply_single_qubit_gate(state, H_GATE, q)
+    elif gate == "Z":
+        if len(qubits) == 1:
+            state = apply_single_qubit_gate(state, Z_GATE, qubits[0])
+        elif len(qubits) == 2:
+            state = apply_cz(state, qubits[0], qubits[1])
+    elif gate == "RY":
+        for q in qubits:
+            state = apply_single_qubit_gate(state, RY_GATE, q)
+    elif gate == "CX":
+        state = apply_cx(state, qubits[0], qubits[1])
+    return state
+
+# In-process NumPy statevector simulation (flat 2^n vector, Qiskit little-endian ordering)
+def simulate_statevector(gate_list, num_qubits=5, initial_state=None):
+    if initial_state is None:
+        state = np.zeros((2,) * num_qubits, dtype=complex)
+        state[(0,) * num_qubits] = 1.0
+    else:
+        state = np.array(initial_state, dtype=complex).reshape((2,) * num_qubits)
+    for gate, qubits in gate_list:
+        if any(q >= num_qubits for q in qubits):
+            print(f"Warning: Invalid qubit index {qubits}, skipping gate")
+            continue
+        state = apply_gate(state, gate, qubits)
+    return state.reshape(-1)
+
+# Largest qubit count for which dense statevectors are built for rendering
+MAX_RENDER_QUBITS = 12
+
+# Two-qubit gate matrices in the |first second> basis
+CX_GATE = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]], dtype=complex)
+CZ_GATE = np.diag([1, 1, 1, -1]).astype(complex)
+SWAP_GATE = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex)
+
+# Matrix product state simulator: site k holds qubit k as a (left, 2, right) tensor kept in
+# mixed canonical form; two-qubit gates are SVD-truncated to max_bond and non-adjacent pairs
+# are routed with SWAPs. truncation_error accumulates the discarded squared singular values
+# and fidelity is the product of the kept weights (an estimate of overlap with the exact state).
+class MPSSimulator:
+    def __init__(self, num_qubits, max_bond=64, cutoff=1e-12):
+        self.num_qubits = num_qubits
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+        self.truncation_error = 0.0
+        self.fidelity = 1.0
+        self.tensors = []
+        for _ in range(num_qubits):
+            tensor = np.zeros((1, 2, 1), dtype=complex)
+            tensor[0, 0, 0] = 1.0
+            self.tensors.append(tensor)
+        self.center = 0
+
+    def bond_dimensions(self):
+        return [t.shape[2] for t in self.tensors[:-1]]
+
+    # Move the orthogonality center to site k with QR sweeps
+    def _move_center(self, k):
+        while self.center < k:
+            i = self.center
+            left, _, right = self.tensors[i].shape
+            Q, R = np.linalg.qr(self.tensors[i].reshape(left * 2, right))
+            self.tensors[i] = Q.reshape(left, 2, -1)
+            self.tensors[i + 1] = np.einsum('ab,bjc->ajc', R, self.tensors[i + 1])
+            self.center += 1
+        while self.center > k:
+            i = self.center
+            left, _, right = self.tensors[i].shape
+            Q, R = np.linalg.qr(self.tensors[i].reshape(left, 2 * right).T)
+            self.tensors[i] = Q.T.reshape(-1, 2, right)
+            self.tensors[i - 1] = np.einsum('ajb,cb->ajc', self.tensors[i - 1], R)
+            self.center -= 1
+
+    def apply_single(self, matrix, q):
+        self.tensors[q] = np.einsum('ij,ajb->aib', matrix, self.tensors[q])
+
+    # Apply a 4x4 gate to sites (k, k+1) and split the result with a truncated SVD
+    def _apply_adjacent(self, matrix, k):
+        self._move_center(k)
+        A, B = self.tensors[k], self.tensors[k + 1]
+        theta = np.einsum('aib,bjc->aijc', A, B)
+        theta = np.einsum('ijkl,aklc->aijc', matrix.reshape(2, 2, 2, 2), theta)
+        left, right = A.shape[0], B.shape[2]
+        U, S, Vh = np.linalg.svd(theta.reshape(left * 2, 2 * right), full_matrices=False)
+        norm = np.sum(S ** 2)
+        keep = max(1, min(self.max_bond, int(np.sum(S ** 2 > self.cutoff * norm))))
+        discarded = float(np.sum(S[keep:] ** 2) / norm)
+        self.truncation_error += discarded
+        self.fidelity *= 1.0 - discarded
+        S = S[:keep] / np.sqrt(np.sum(S[:keep] ** 2))
+        self.tensors[k] = U[:, :keep].reshape(left, 2, keep)
+        self.tensors[k + 1] = (S[:, None] * Vh[:keep]).reshape(keep, 2, right)
+        self.center = k + 1
+
+    # Apply a 4x4 gate on qubits (a, b), routing b next to a with adjacent SWAPs and back
+    def apply_two(self, matrix, a, b):
+        if a > b:
+            a, b = b, a
+            matrix = SWAP_GATE @ matrix @ SWAP_GATE
+        for k in range(b - 1, a, -1):
+            self._apply_adjacent(SWAP_GATE, k)
+        self._apply_adjacent(matrix, a)
+        for k in range(a + 1, b):
+            self._apply_adjacent(SWAP_GATE, k)
+
+    # Same gate semantics as build_quantum_circuit_from_gates
+    def apply(self, gate, qubits):
+        if gate == "H":
+            for q in qubits:
+                self.apply_single(H_GATE, q)
+        elif gate == "Z":
+            if len(qubits) == 1:
+                self.apply_single(Z_GATE, qubits[0])
+            elif len(qubits) == 2:
+                self.apply_two(CZ_GATE, qubits[0], qubits[1])
+        elif gate == "RY":
+            for q in qubits:
+                self.apply_single(RY_GATE, q)
+        elif gate == "CX":
+            self.apply_two(CX_GATE, qubits[0], qubits[1])
+
+    # Per-qubit Bloch vectors from single-site reduced density matrices (one canonical sweep)
+    def bloch_vectors(self):
+        vectors = np.empty((self.num_qubits, 3))
+        self._move_center(0)
+        for q in range(self.num_qubits):
+            self._move_center(q)
+            T = self.tensors[q]
+            rho = np.einsum('aib,ajb->ij', T, T.conj())
+            vectors[q] = [2 * rho[0, 1].real, -2 * rho[0, 1].imag, (rho[0, 0] - rho[1, 1]).real]
+        return vectors
+
+    # Dense statevector in Qiskit ordering (only for small qubit counts)
+    def to_statevector(self):
+        psi = self.tensors[0]
+        for tensor in self.tensors[1:]:
+            psi = np.einsum('a...b,bjc->a...jc', psi, tensor)
+        psi = psi.reshape((2,) * self.num_qubits)
+        return psi.transpose(range(self.num_qubits - 1, -1, -1)).reshape(-1)
+
+# Run a gate list on the MPS backend
+def simulate_mps(gate_list, num_qubits, max_bond=64, cutoff=1e-12):
+    mps = MPSSimulator(num_qubits, max_bond=max_bond, cutoff=cutoff)
+    for gate, qubits in gate_list:
+        if any(q >= num_qubits for q in qubits):
+            print(f"Warning: Invalid qubit index {qubits}, skipping gate")
+            continue
+        mps.apply(gate, qubits)
+    return mps
+
+# Single-qubit reduced density matrices by batched partial trace: (2^n,) or (B, 2^n) -> (B, n, 2, 2)
+def reduced_density_matrices(states, num_qubits):
+    states = np.asarray(states).reshape(-1, 2 ** num_qubits)
+    rho = np.empty((len(states), num_qubits, 2, 2), dtype=complex)
+    for q in range(num_qubits):
+        psi = states.reshape(len(states), -1, 2, 2 ** q)
+        rho[:, q] = np.einsum('bais,bajs->bij', psi, psi.conj())
+    return rho
+
+# Two-qubit reduced density matrices for every pair i < j in the |q_i q_j> basis -> (B, n_pairs, 4, 4)
+def pair_density_matrices(states, num_qubits):
+    states = np.asarray(states).reshape(-1, 2 ** num_qubits)
+    pairs = [(i, j) for i in range(num_qubits) for j in range(i + 1, num_qubits)]
+    rho = np.empty((len(states), len(pairs), 4, 4), dtype=complex)
+    for p, (i, j) in enumerate(pairs):
+        psi = states.reshape(len(states), 2 ** (num_qubits - 1 - j), 2, 2 ** (j - 1 - i), 2, 2 ** i)
+        rho[:, p] = np.einsum('bAjMiC,bAkMlC->bijlk', psi, psi.conj()).reshape(-1, 4, 4)
+    return rho
+
+# Bloch vectors (..., 3) from single-qubit density matrices (..., 2, 2)
+def bloch_from_density(rho):
+    return np.stack([2 * rho[..., 0, 1].real, -2 * rho[..., 0, 1].imag,
+                     (rho[..., 0, 0] - rho[..., 1, 1]).real], axis=-1)
+
+# Purity tr(rho^2) of a batch of density matrices
+def purities(rho):
+    return np.einsum('...ij,...ji->...', rho, rho).real
+
+# Wootters concurrence of a batch of two-qubit density matrices
+def concurrences(rho):
+    yy = np.kron(np.array([[0, -1j], [1j, 0]]), np.array([[0, -1j], [1j, 0]]))
+    R = rho @ yy @ rho.conj() @ yy
+    lam = np.sort(np.sqrt(np.abs(np.linalg.eigvals(R).real)), axis=-1)[..., ::-1]
+    return np.maximum(0.0, lam[..., 0] - lam[..., 1] - lam[..., 2] - lam[..., 3])
+
+# Per-time-step log of numerical observables (Bloch vectors, purities, pairwise concurrences)
+class ObservableLog:
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self.steps = []
+        self.bloch = []
+        self.purity = []
+        self.concurrence = []
+
+    # Log from a statevector, or from precomputed Bloch vectors (e.g. the MPS backend, no concurrences)
+    def append(self, step, statevector=None, bloch=None):
+        n_pairs = self.num_qubits * (self.num_qubits - 1) // 2
+        if statevector is not None:
+            rho = reduced_density_matrices(statevector, self.num_qubits)[0]
+            bloch = bloch_from_density(rho)
+            purity = purities(rho)
+            concurrence = concurrences(pair_density_matrices(statevector, self.num_qubits)[0])
+        else:
+            bloch = np.asarray(bloch)
+            purity = (1 + np.sum(bloch ** 2, axis=-1)) / 2
+            concurrence = np.full(n_pairs, np.nan)
+        self.steps.append(step)
+        self.bloch.append(bloch)
+        self.purity.append(purity)
+        self.concurrence.append(concurrence)
+        return bloch, purity, concurrence
+
+    def arrays(self):
+        return {'step': np.array(self.steps), 'bloch': np.array(self.bloch),
+                'purity': np.array(self.purity), 'concurrence': np.array(self.concurrence)}
+
+    def save(self, path='observables.npz'):
+        np.savez_compressed(path, **self.arrays())
+
+# Single-qubit Bloch vectors of one or many statevectors: (2^n,) or (B, 2^n) -> (B, n, 3)
+def bloch_vectors(states, num_qubits):
+    return bloch_from_density(reduced_density_matrices(states, num_qubits))
+
+# Evaluate B gate lists at once on a stacked (B, 2, ..., 2) state; at each position the members
+# are grouped by gate, so a gate shared by the whole ensemble is a single batched matmul
+def simulate_statevector_batch(gate_lists, num_qubits=5):
+    batch = len(gate_lists)
+    states = np.zeros((batch,) + (2,) * num_qubits, dtype=complex)
+    states[(slice(None),) + (0,) * num_qubits] = 1.0
+    for position in range(max((len(g) for g in gate_lists), default=0)):
+        groups = defaultdict(list)
+        for member, gate_list in enumerate(gate_lists):
+            if position < len(gate_list):
+                gate, qubits = gate_list[position]
+                if all(q < num_qubits for q in qubits):
+                    groups[(gate, tuple(qubits))].append(member)
+        for (gate, qubits), members in groups.items():
+            if len(members) == batch:
+                states = apply_gate(states, gate, qubits)
+            else:
+                members = np.array(members)
+                states[members] = apply_gate(states[members], gate, qubits)
+    return states.reshape(batch, -1)
+
+# Random ensemble of reconfigured gate lists evaluated in one batch; output 'bloch' or 'probabilities'
+def evaluate_gate_ensemble(current_gates, n_members, num_qubits=5, output='bloch'):
+    gate_lists = [quantum_gate_reconfig(num_qubits, current_gates) for _ in range(n_members)]
+    states = simulate_statevector_batch(gate_lists, num_qubits)
+    if output == 'probabilities':
+        return np.abs(states) ** 2
+    return bloch_vectors(states, num_qubits)
+
+# Run the gate list on AerSimulator and compare with the NumPy backend
+def cross_check_statevector(gate_list, statevector, num_qubits=5, atol=1e-8):
+    from qiskit import transpile
+    from qiskit_aer import AerSimulator
+    qc = build_quantum_circuit_from_gates(gate_list, num_qubits=num_qubits)
+    simulator = AerSimulator()
+    reference = np.asarray(simulator.run(transpile(qc, simulator)).result().get_statevector())
+    if not np.allclose(statevector, reference, atol=atol):
+        print(f"Warning: statevector differs from Qiskit (max error {np.abs(statevector - reference).max():.2e})")
+        return False
+    return True
+
+# Bounded LRU cache of statevectors and transpiled circuits keyed by gate-list fingerprint
+class CircuitCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._states = OrderedDict()
+        self._transpiled = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.prefix_hits = 0
+        self.transpile_hits = 0
+        self.transpile_misses = 0
+
+    # Chained fingerprints: entry k identifies the first k gates (entry 0 is the empty circuit)
+    @staticmethod
+    def fingerprints(gate_list, num_qubits):
+        h = hashlib.blake2b(f"qubits={num_qubits}".encode(), digest_size=16)
+        keys = [h.digest()]
+        for gate, qubits in gate_list:
+            h = h.copy()
+            h.update(f"|{gate}:{','.join(str(q) for q in qubits)}".encode())
+            keys.append(h.digest())
+        return keys
+
+    def _store(self, table, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.maxsize:
+            table.popitem(last=False)
+
+    # Cached statevector; on a miss, resume from the longest cached prefix and apply only the remaining gates
+    def get_statevector(self, gate_list, num_qubits=5):
+        keys = self.fingerprints(gate_list, num_qubits)
+        state = self._states.get(keys[-1])
+        if state is not None:
+            self.hits += 1
+            self._states.move_to_end(keys[-1])
+            return state
+        self.misses += 1
+        start, initial = 0, None
+        for k in range(len(gate_list) - 1, 0, -1):
+            if keys[k] in self._states:
+                start, initial = k, self._states[keys[k]]
+                self._states.move_to_end(keys[k])
+                self.prefix_hits += 1
+                break
+        state = simulate_statevector(gate_list[start:], num_qubits, initial_state=initial)
+        state.flags.writeable = False  # cached arrays are shared with callers
+        self._store(self._states, keys[-1], state)
+        return state
+
+    # Cached transpiled circuit for the Qiskit backend
+    def get_transpiled(self, gate_list, simulator, num_qubits=5):
+        from qiskit import transpile
+        key = self.fingerprints(gate_list, num_qubits)[-1]
+        compiled = self._transpiled.get(key)
+        if compiled is not None:
+            self.transpile_hits += 1
+            self._transpiled.move_to_end(key)
+            return compiled
+        self.transpile_misses += 1
+        compiled = transpile(build_quantum_circuit_from_gates(gate_list, num_qubits=num_qubits), simulator)
+        self._store(self._transpiled, key, compiled)
+        return compiled
+
+    def report(self):
+        print(f"Circuit cache | statevector hits {self.hits} (prefix reuse {self.prefix_hits}) | "
+              f"misses {self.misses} | transpile hits {self.transpile_hits} | "
+              f"transpile misses {self.transpile_misses}")
+
+# Vectorized Fruchterman-Reingold layout on edge arrays; repulsion is approximated Barnes-Hut style
+# by grid cells (mass at each cell's centroid), so a step costs O(n * cells + edges)
+def force_layout(pos, src, dst, n, iterations=30, grid=16, chunk=4096, seed=42):
+    rng = np.random.default_rng(seed)
+    pos = np.array(pos, dtype=float) if pos is not None else rng.uniform(-1, 1, (n, 2))
+    k = np.sqrt(4.0 / max(n, 1))
+    temperature = 0.1
+    for _ in range(iterations):
+        # Cell masses and centroids
+        lo, hi = pos.min(axis=0), pos.max(axis=0)
+        cell_xy = np.minimum(((pos - lo) / np.maximum(hi - lo, 1e-9) * grid).astype(int), grid - 1)
+        cell = cell_xy[:, 0] * grid + cell_xy[:, 1]
+        mass = np.bincount(cell, minlength=grid * grid)
+        occupied = mass > 0
+        centroid = np.stack([np.bincount(cell, pos[:, d], grid * grid) for d in range(2)], axis=1)
+        centroid = centroid[occupied] / mass[occupied, None]
+        mass = mass[occupied]
+        # Repulsion from every occupied cell, in chunks to bound memory
+        disp = np.empty_like(pos)
+        centroid_sq = np.sum(centroid ** 2, axis=1)
+        for start in range(0, n, chunk):
+            p = pos[start:start + chunk]
+            dist2 = np.maximum(np.sum(p ** 2, axis=1)[:, None] + centroid_sq - 2 * p @ centroid.T, 1e-4)
+            w = mass * k ** 2 / dist2
+            disp[start:start + chunk] = p * w.sum(axis=1)[:, None] - w @ centroid
+        # Attraction along synapses
+        delta = pos[dst] - pos[src]
+        pull = delta * (np.sqrt(np.sum(delta ** 2, axis=-1)) / k)[:, None]
+        for d in range(2):
+            disp[:, d] += np.bincount(src, pull[:, d], n) - np.bincount(dst, pull[:, d], n)
+        # Limit each step by the temperature, then cool down
+        length = np.maximum(np.sqrt(np.sum(disp ** 2, axis=-1)), 1e-9)
+        pos += disp / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+    # Rescale to [-1, 1] like nx.spring_layout
+    pos -= pos.mean(axis=0)
+    return pos / max(np.abs(pos).max(), 1e-9)
+
+# Layout service: each step warm-starts from the previous step's positions, so nodes stay put
+# between frames; only the latest step is kept (repeat calls for it are free).
+# Graphs above large_graph nodes use force_layout
+class LayoutService:
+    def __init__(self, seed=42, iterations=50, warm_iterations=10, large_graph=500):
+        self.seed = seed
+        self.iterations = iterations
+        self.warm_iterations = warm_iterations
+        self.large_graph = large_graph
+        self._last_step = None
+        self._last = None
+
+    def layout(self, G, time_step):
+        if time_step == self._last_step:
+            return self._last
+        previous = self._last or {}
+        initial = {node: previous[node] for node in G.nodes() if node in previous}
+        iterations = self.warm_iterations if initial else self.iterations
+        if G.number_of_nodes() <= self.large_graph:
+            # scale=None keeps raw coordinates, so a warm start begins at the previous equilibrium
+            pos = nx.spring_layout(G, pos=initial or None, iterations=iterations, seed=self.seed, scale=None)
+        else:
+            nodes = list(G.nodes())
+            index = {node: i for i, node in enumerate(nodes)}
+            edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+            start = None
+            if len(initial) == len(nodes):
+                start = np.array([initial[node] for node in nodes])
+            coords = force_layout(start, edges[:, 0], edges[:, 1], len(nodes), iterations=iterations, seed=self.seed)
+            pos = dict(zip(nodes, coords))
+        self._last_step = time_step
+        self._last = pos
+        return pos
+
+# Rasterize a figure to an RGBA array with the Agg renderer and close it
+def figure_to_rgba(fig):
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    rgba = np.asarray(canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    return rgba
+
+def _describe(ax, description, text=None):
+    (text or ax.text)(0.02, 0.95, description, transform=ax.transAxes, fontsize=8,
+                      verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
+
+# Render the synaptic network panel once to RGBA (fixed figure size keeps frames aligned)
+def render_synaptic_rgba(G, time_step, pos=None):
+    fig, ax = plt.subplots(figsize=(5, 5))
+    pos = pos if pos is not None else nx.spring_layout(G, seed=42)
     weights = [G[u][v]['weight'] for u, v in G.edges()]
-    nx.draw(G, pos, with_labels=True, edge_color=weights, edge_cmap=plt.cm.Blues, ax=ax1)
-    ax1.set_title("Synaptic Network")
-    num_nodes = G.number_of_nodes()
-    num_edges = G.number_of_edges()
-    description = f'Neurons: {num_nodes}\nSynapses: {num_edges}\nTime Step: {time_step}'
-    ax1.text(0.02, 0.95, description, transform=ax1.transAxes, fontsize=8,
-             verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
+    nx.draw(G, pos, with_labels=True, edge_color=weights, edge_cmap=plt.cm.Blues, ax=ax)
+    ax.set_title("Synaptic Network")
+    _describe(ax, f'Neurons: {G.number_of_nodes()}\nSynapses: {G.number_of_edges()}\nTime Step: {time_step}')
+    return figure_to_rgba(fig)
 
-    # Quantum circuit
-    qc.draw(output='mpl', ax=ax2)
-    num_qubits = qc.num_qubits
-    num_gates = len(qc.data)
-    description = f'Qubits: {num_qubits}\nGates: {num_gates}\nTime Step: {time_step}'
-    ax2.text(0.02, 0.95, description, transform=ax2.transAxes, fontsize=8,
-             verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
-    ax2.set_title("Quantum Circuit")
-
-    # Apply tight layout before Bloch sphere to avoid layout issues
-    plt.tight_layout()
-
-    # Bloch sphere
-    # Create a temporary figure for Bloch sphere
-    temp_fig = plt.figure()
-    plot_bloch_multivector(statevector)
-    # Save to a bytes buffer
-    buf = io.BytesIO()
-    temp_fig.savefig(buf, format='png', bbox_inches='tight')
-    buf.seek(0)
-    bloch_img = Image.open(buf)
-    # Draw image onto ax3
-    ax3.imshow(bloch_img)
-    ax3.axis('off')  # Hide axes for image
-    ax3.text(0.02, 0.95, description, transform=ax3.transAxes, fontsize=8,
+# Render the quantum circuit panel once to RGBA
+def render_circuit_rgba(qc, time_step):
+    fig, ax = plt.subplots(figsize=(7.5, 5))
+    qc.draw(output='mpl', ax=ax)
+    ax.set_title("Quantum Circuit")
+    _describe(ax, f'Qubits: {qc.num_qubits}\nGates: {len(qc.data)}\nTime Step: {time_step}')
+    return figure_to_rgba(fig)
+
+# Render the Bloch sphere panel once to RGBA (no PNG round-trip)
+def render_bloch_rgba(statevector, time_step):
+    from qiskit.visualization import plot_bloch_multivector
+    statevector = np.asarray(statevector)
+    fig = plot_bloch_multivector(statevector)
+    fig.suptitle("Bloch Sphere")
+    fig.text(0.01, 0.99, f'Qubits: {int(np.log2(len(statevector)))}\nTime Step: {time_step}', fontsize=8,
              verticalalignment='top', bbox=dict(facecolor='white', alpha=0.7))
-    ax3.set_title("Bloch Sphere")
-    plt.close(temp_fig)  # Close temporary figure
-    buf.close()
-
-    # Set suptitle with adjusted position to avoid overlapping qubit 2
-    plt.suptitle(title, fontsize=12, y=1.05)
-    plt.savefig(f'combined_t{time_step}.png', bbox_inches='tight')
-    plt.close()
-
-# Create GIF
-def create_gif(time_steps):
-    images = [Image.open(f'combined_t{t}.png') for t in range(time_steps)]
-    images[0].save('combined_simulation.gif', save_all=True, append_images=images[1:], duration=1000, loop=0)
-    
-    # Clean up temporary files (keep individual PNGs)
-    for t in range(time_steps):
-        if os.path.exists(f'combined_t{t}.png'):
-            os.remove(f'combined_t{t}.png')
+    return figure_to_rgba(fig)
+
+# Composite panels side by side under a title strip, entirely in memory
+def composite_frame(panels, title):
+    height = max(p.shape[0] for p in panels)
+    padded = [np.pad(p, ((0, height - p.shape[0]), (0, 0), (0, 0)), constant_values=255) for p in panels]
+    body = np.hstack(padded)
+    dpi = plt.rcParams['figure.dpi']
+    fig = plt.figure(figsize=(body.shape[1] / dpi, 40 / dpi), dpi=dpi)
+    fig.text(0.5, 0.5, title, fontsize=12, ha='center', va='center')
+    return np.vstack([figure_to_rgba(fig)[:, :body.shape[1]], body])
+
+# Incremental frame writer: every frame is piped straight to ffmpeg as raw RGBA, so memory stays
+# constant however many steps run (MP4 as yuv420p, GIF with a palette generated per frame)
+class FrameWriter:
+    GIF_FILTER = 'split[a][b];[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1'
+
+    def __init__(self, path='combined_simulation.gif', fps=1):
+        self.path = path
+        self.fps = fps
+        self.size = None
+        self.frames = 0
+        self._process = None
+
+    # Pad/crop to the first frame's size so every frame has the same shape
+    def _fit(self, rgba):
+        h, w = self.size
+        out = np.full((h, w, 4), 255, dtype=np.uint8)
+        out[:min(h, rgba.shape[0]), :min(w, rgba.shape[1])] = rgba[:h, :w]
+        return out
+
+    def write(self, rgba):
+        if self.size is None:
+            # Even dimensions for yuv420p
+            self.size = (rgba.shape[0] + rgba.shape[0] % 2, rgba.shape[1] + rgba.shape[1] % 2)
+            h, w = self.size
+            if self.path.endswith('.mp4'):
+                encode = ['-pix_fmt', 'yuv420p']
+            elif self.path.endswith('.gif'):
+                encode = ['-filter_complex', self.GIF_FILTER, '-loop', '0']
+            else:
+                encode = []
+            self._process = subprocess.Popen(
+                [plt.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error', '-f', 'rawvideo',
+                 '-pix_fmt', 'rgba', '-s', f'{w}x{h}', '-r', str(self.fps), '-i', '-',
+                 *encode, self.path], stdin=subprocess.PIPE)
+        self._process.stdin.write(self._fit(rgba).tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+# Render one time step: each component once, optional per-component PNGs, composite frame returned
+def render_frame(G, qc, statevector, title, time_step, pos=None, save_components=True):
+    panels = {
+        'synaptic': render_synaptic_rgba(G, time_step, pos),
+        'circuit': render_circuit_rgba(qc, time_step),
+        'bloch': render_bloch_rgba(statevector, time_step),
+    }
+    if save_components:
+        for name, rgba in panels.items():
+            Image.fromarray(rgba, 'RGBA').save(f'{name}_t{time_step}.png')
+    return composite_frame(list(panels.values()), title)
+
+# Frozen per-step render input: edge arrays, gate list, statevector and layout (all picklable)
+def snapshot_step(synapses, quantum_gates, n_qubits, statevector, pos, time_step, save_components=True):
+    store = SynapseStore(synapses.n_neurons, synapses.src.copy(), synapses.dst.copy(), synapses.weight.copy())
+    return (store, list(quantum_gates), n_qubits, np.asarray(statevector), pos, time_step, save_components)
+
+# Top-level so worker processes can unpickle it: rebuild the graph and circuit, render one frame
+def render_snapshot(snapshot):
+    store, quantum_gates, n_qubits, statevector, pos, t, save_components = snapshot
+    qc = build_quantum_circuit_from_gates(quantum_gates, num_qubits=n_qubits)
+    return render_frame(store.to_networkx(), qc, statevector, f"Simulation Results (Time {t})", t,
+                        pos=pos, save_components=save_components)
+
+# Ordered fan-out of snapshots to a process pool; at most 2 * workers frames are in flight,
+# and finished frames are written in time-step order as soon as the head of the queue is done
+class ParallelRenderer:
+    def __init__(self, writer, workers):
+        self.writer = writer
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._pending = deque()
+
+    def submit(self, snapshot):
+        self._pending.append(self._executor.submit(render_snapshot, snapshot))
+        while len(self._pending) > 2 * self.workers or (self._pending and self._pending[0].done()):
+            self.writer.write(self._pending.popleft().result())
+
+    def close(self):
+        while self._pending:
+            self.writer.write(self._pending.popleft().result())
+        self._executor.shutdown()
 
 # Main simulation function
-def run_simulation(time_steps=3):
-    G = init_synaptic_network(n_neurons=10)
+# backend='numpy' uses the in-process statevector simulator ('qiskit' runs AerSimulator, 'mps' the
+# matrix product state backend for large n_qubits, truncated to max_bond);
+# cross_check=True verifies every NumPy or MPS statevector against Qiskit; cache_size=0 disables the circuit cache
+# ensemble_size > 0 also evaluates that many random reconfigurations per step in one batch (dense, so
+# skipped above MAX_RENDER_QUBITS)
+# Observables are logged every step to observables_path; render=False skips all image output
+# Frames are rendered once in memory and streamed to output (.gif or .mp4); save_components keeps per-panel PNGs
+# render_workers > 0 snapshots each step and renders the frames in that many worker processes
+# dynamics='lif' or 'rate' runs dynamics_steps of neuronal activity (with plasticity) per time step and
+# lets each qubit's neuron group activity steer gate reconfiguration
+# history_path records the delta-encoded synapse history (keyframes every keyframe_every steps)
+# avg_degree sets a sparse initial network (default is dense p=0.3); large n_neurons need it, e.g. avg_degree=10
+def run_simulation(time_steps=3, n_neurons=10, backend='numpy', cross_check=False, cache_size=256, ensemble_size=0,
+                   n_qubits=5, max_bond=64, render=True, observables_path='observables.npz',
+                   output='combined_simulation.gif', save_components=True, render_workers=0,
+                   dynamics=None, dynamics_steps=50, history_path=None, keyframe_every=10, avg_degree=None):
+    rng = np.random.default_rng()
+    synapses = init_synapse_store(n_neurons, avg_degree=avg_degree, rng=rng)
     quantum_gates = [('H', [0]), ('CX', [0,1]), ('RY', [1,2])]
+    cache = CircuitCache(cache_size) if cache_size and backend != 'mps' else None
+    observables = ObservableLog(n_qubits)
+    layouts = LayoutService()
+    neurons = NeuralDynamics(n_neurons, model=dynamics, rng=rng) if dynamics else None
+    history = SynapseHistory(synapses, keyframe_every=keyframe_every) if history_path else None
+    writer = FrameWriter(output) if render else None
+    renderer = ParallelRenderer(writer, render_workers) if render and render_workers else None
 
-    simulator = AerSimulator()
+    if backend == 'qiskit':
+        from qiskit import transpile
+        from qiskit_aer import AerSimulator
+        simulator = AerSimulator()
 
     for t in range(time_steps):
         print(f"--- Time Step {t} ---")
-        G = update_synapses(G)
-        quantum_gates = quantum_gate_reconfig(n_qubits=5, current_gates=quantum_gates)
+        synapses = update_synapse_store(synapses, rng=rng)
+        print(f"Synapses: {synapses.number_of_edges()} | Mean Weight: {synapses.weight.mean() if synapses.number_of_edges() else 0.0:.3f}")
+        activity = None
+        if neurons is not None:
+            spikes_before = neurons.spike_count
+            rate = neurons.step(synapses, n_steps=dynamics_steps)
+            activity = group_activity(rate, n_qubits)
+            spikes = f" | Spikes: {neurons.spike_count - spikes_before}" if dynamics == 'lif' else ""
+            print(f"Activity | Mean Rate: {rate.mean():.3f}{spikes} | "
+                  f"Mean Weight after plasticity: {synapses.weight.mean() if synapses.number_of_edges() else 0.0:.3f}")
+        if history is not None:
+            history.record(synapses)
+        quantum_gates = quantum_gate_reconfig(n_qubits=n_qubits, current_gates=quantum_gates, activity=activity)
         print(f"Quantum Gate Structure: {quantum_gates}\n")
-        qc = build_quantum_circuit_from_gates(quantum_gates, num_qubits=5)
-        compiled = transpile(qc, simulator)
-        result = simulator.run(compiled).result()
-        statevector = result.get_statevector()
-        # Generate individual PNGs
-        plot_synaptic_graph(G, time_step=t)
-        plot_quantum_circuit(qc, time_step=t)
-        plot_bloch_sphere(statevector, time_step=t)
-        # Generate combined PNG
-        plot_combined(G, qc, statevector, f"Simulation Results (Time {t})", time_step=t)
+        if backend == 'qiskit':
+            qc = build_quantum_circuit_from_gates(quantum_gates, num_qubits=n_qubits)
+            compiled = cache.get_transpiled(quantum_gates, simulator, num_qubits=n_qubits) if cache else transpile(qc, simulator)
+            result = simulator.run(compiled).result()
+            statevector = result.get_statevector()
+        elif backend == 'mps':
+            mps = simulate_mps(quantum_gates, n_qubits, max_bond=max_bond)
+            print(f"MPS | Max Bond: {max(mps.bond_dimensions(), default=1)} | "
+                  f"Truncation Error: {mps.truncation_error:.2e} | Fidelity: {mps.fidelity:.6f}")
+            # Dense statevector only where it is feasible
+            statevector = mps.to_statevector() if n_qubits <= MAX_RENDER_QUBITS else None
+            if statevector is None:
+                observables.append(t, bloch=mps.bloch_vectors())
+        elif cache is not None:
+            statevector = cache.get_statevector(quantum_gates, num_qubits=n_qubits)
+        else:
+            statevector = simulate_statevector(quantum_gates, num_qubits=n_qubits)
+        if cross_check and backend != 'qiskit' and statevector is not None:
+            # MPS truncation and SVD round-off leave ~1e-7 amplitude errors even below max_bond
+            cross_check_statevector(quantum_gates, statevector, num_qubits=n_qubits,
+                                    atol=1e-6 if backend == 'mps' else 1e-8)
+        if statevector is not None:
+            observables.append(t, statevector=np.asarray(statevector))
+        print(f"Mean Purity: {observables.purity[-1].mean():.3f} | "
+              f"Max Concurrence: {np.nanmax(observables.concurrence[-1], initial=0.0):.3f}")
+        if ensemble_size and n_qubits > MAX_RENDER_QUBITS:
+            print(f"Skipping ensemble for {n_qubits} qubits (dense limit {MAX_RENDER_QUBITS})")
+        elif ensemble_size:
+            ensemble = evaluate_gate_ensemble(quantum_gates, ensemble_size, num_qubits=n_qubits)
+            print(f"Ensemble ({ensemble_size}) mean Bloch z per qubit: {ensemble[:, :, 2].mean(axis=0).round(3)}")
+        if not render:
+            continue
+        if statevector is None:
+            print(f"Skipping rendering for {n_qubits} qubits (limit {MAX_RENDER_QUBITS})")
+            continue
+        G = synapses.to_networkx()
+        # Layouts stay in this process: each one warm-starts from the previous step
+        pos = layouts.layout(G, time_step=t)
+        if renderer is not None:
+            renderer.submit(snapshot_step(synapses, quantum_gates, n_qubits, statevector, pos, t, save_components))
+            continue
+        if backend != 'qiskit':
+            qc = build_quantum_circuit_from_gates(quantum_gates, num_qubits=n_qubits)
+        writer.write(render_frame(G, qc, statevector, f"Simulation Results (Time {t})", t,
+                                  pos=pos, save_components=save_components))
     
-    # Generate GIF
-    create_gif(time_steps)
+    if cache is not None:
+        cache.report()
+    if observables_path:
+        observables.save(observables_path)
+    if history is not None:
+        history.save(history_path)
+
+    # Finish GIF/MP4
+    if renderer is not None:
+        renderer.close()
+    if writer is not None:
+        writer.close()
 
 if __name__ == '__main__':
     run_simulation(time_steps=3)
\ No newline at end of file
@@ -1,16 +1,23 @@
 import numpy as np
 import time
+import asyncio
+import atexit
+import csv
+import json
+import math
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from matplotlib.animation import FuncAnimation, FFMpegWriter
 
 class RealTimeDataStream:
-    def __init__(self, data_length=100):
+    def __init__(self, data_length=100, seed=None):
         self.data_length = data_length
         self.current_index = 0
+        # 指定 seed 時使用獨立亂數產生器，讓整段串流可重現
+        self.rng = np.random if seed is None else np.random.default_rng(seed)
 
     def get_next_data(self):
         # 模擬隨機即時資料（可替換成真實資料串流）
-        data = np.sin(0.1 * self.current_index) + np.random.normal(scale=0.1)
+        data = np.sin(0.1 * self.current_index) + self.rng.normal(scale=0.1)
         self.current_index += 1
         return data
 
@@ -29,6 +36,145 @@ class SimpleAIModel:
         lr = 0.01
         self.weight -= lr * grad
 
+def _rowdot(a, b):
+    # 沿最後一維的內積；matmul 對單一串流與多串流都很快
+    return (a[..., None, :] @ b[..., :, None])[..., 0, 0]
+
+class RLSModel:
+    def __init__(self, n_streams=None, forgetting=0.99, delta=100.0, bias=True):
+        # 遞迴最小平方法：特徵 [x, 1]，每筆 O(p²) 運算、記憶體固定
+        # n_streams 不為 None 時，所有狀態多一個串流維度，可一次更新多條串流
+        self.forgetting = forgetting
+        self.bias = bias
+        shape = () if n_streams is None else (n_streams,)
+        size = self._n_features()
+        self.max_trace = delta * size
+        self.w = np.zeros(shape + (size,))
+        self.P = np.broadcast_to(np.eye(size) * delta, shape + (size, size)).copy()
+
+    def _n_features(self):
+        return 2 if self.bias else 1
+
+    def _features(self, x):
+        x = np.asarray(x, dtype=float)
+        phi = np.empty(x.shape + (self.w.shape[-1],))
+        phi[..., 0] = x
+        if self.bias:
+            phi[..., 1] = 1.0
+        return phi
+
+    def _output(self, phi):
+        y = _rowdot(self.w, phi)
+        return float(y) if y.ndim == 0 else y
+
+    def _correct(self, phi, y_true):
+        # 以增益向量修正權重並更新共變異數矩陣
+        Pphi = (self.P @ phi[..., None])[..., 0]
+        denom = self._noise() + _rowdot(phi, Pphi)
+        gain = Pphi / denom[..., None]
+        error = np.asarray(y_true, dtype=float) - _rowdot(self.w, phi)
+        self.w += gain * error[..., None]
+        self.P -= gain[..., :, None] * Pphi[..., None, :]
+        # 對稱化以維持數值穩定（避免 P 失去正定性而發散）
+        self.P = 0.5 * (self.P + np.swapaxes(self.P, -1, -2))
+        self._decay()
+
+    def _noise(self):
+        return self.forgetting
+
+    def _decay(self):
+        # 輸入缺乏激發時不再放大 P，避免遺忘因子造成 wind-up
+        trace = np.trace(self.P, axis1=-2, axis2=-1)
+        self.P /= np.where(trace < self.max_trace, self.forgetting, 1.0)[..., None, None]
+
+    def predict(self, x):
+        return self._output(self._features(x))
+
+    def update(self, x, y_true):
+        self._correct(self._features(x), y_true)
+
+class KalmanModel(RLSModel):
+    def __init__(self, n_streams=None, process_noise=1e-4, measurement_noise=1e-2, delta=1.0, bias=True):
+        # 權重視為隨機漫步狀態的小型卡爾曼濾波器（y = w·[x, 1] + v）
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        super().__init__(n_streams=n_streams, delta=delta, bias=bias)
+
+    def _noise(self):
+        return self.measurement_noise
+
+    def _decay(self):
+        # 預測步驟：狀態共變異數加上過程雜訊
+        self.P += self.process_noise * np.eye(self.P.shape[-1])
+
+class ARModel(RLSModel):
+    def __init__(self, order=3, n_streams=None, forgetting=0.99, delta=100.0, bias=True):
+        # AR(p)：以目前值與前 p-1 個值預測，係數以 RLS 逐筆更新
+        self.order = order
+        super().__init__(n_streams=n_streams, forgetting=forgetting, delta=delta, bias=bias)
+        shape = () if n_streams is None else (n_streams,)
+        self.lags = np.zeros(shape + (order - 1,))
+
+    def _n_features(self):
+        return self.order + (1 if self.bias else 0)
+
+    def _features(self, x):
+        x = np.asarray(x, dtype=float)
+        phi = np.empty(x.shape + (self.w.shape[-1],))
+        phi[..., 0] = x
+        phi[..., 1:self.order] = self.lags
+        if self.bias:
+            phi[..., -1] = 1.0
+        return phi
+
+    def update(self, x, y_true):
+        super().update(x, y_true)
+        # 推入新的延遲值（固定長度）
+        if self.order > 1:
+            self.lags[..., 1:] = self.lags[..., :-1].copy()
+            self.lags[..., 0] = x
+
+def benchmark_models(n_samples=5000, n_streams=10000, seed=0):
+    # 比較各模型的一步預測誤差（predict(x_t) 對 x_{t+1}）與每筆成本
+    data_stream = RealTimeDataStream(seed=seed)
+    series = [data_stream.get_next_data() for _ in range(n_samples + 1)]
+    factories = {
+        'SimpleAIModel': SimpleAIModel,
+        'RLSModel': RLSModel,
+        'KalmanModel': KalmanModel,
+        'ARModel(3)': ARModel,
+    }
+    results = {}
+    for name, factory in factories.items():
+        model = factory()
+        errors = np.empty(n_samples)
+        start = time.perf_counter()
+        for t in range(n_samples):
+            prediction = model.predict(series[t])
+            model.update(series[t], series[t + 1])
+            errors[t] = prediction - series[t + 1]
+        per_sample = (time.perf_counter() - start) / n_samples
+        # 後半段的誤差代表收斂後的預測品質
+        rmse = float(np.sqrt(np.mean(errors[n_samples // 2:] ** 2)))
+        results[name] = {'rmse': rmse, 'us_per_sample': per_sample * 1e6}
+        print(f"{name:<14} | RMSE {rmse:.4f} | {per_sample * 1e6:7.2f} us/sample")
+
+    # 向量化批次路徑：n_streams 條串流一起更新
+    rng = np.random.default_rng(seed)
+    phase = rng.uniform(0, 2 * np.pi, n_streams)
+    for name, factory in list(factories.items())[1:]:
+        model = factory(n_streams=n_streams)
+        start = time.perf_counter()
+        for t in range(100):
+            x = np.sin(0.1 * t + phase) + rng.normal(scale=0.1, size=n_streams)
+            y = np.sin(0.1 * (t + 1) + phase)
+            model.predict(x)
+            model.update(x, y)
+        per_update = (time.perf_counter() - start) / (100 * n_streams)
+        results[name]['ns_per_stream_batched'] = per_update * 1e9
+        print(f"{name:<14} | batched {n_streams} streams | {per_update * 1e9:7.1f} ns/stream-update")
+    return results
+
 class PredictiveField:
     def __init__(self):
         self.field_state = 0.0
@@ -37,17 +183,512 @@ class PredictiveField:
         # 利用預測結果與資料更新場的狀態
         self.field_state = 0.8 * self.field_state + 0.2 * (prediction + data) / 2
 
-def main_simulation(steps=100):
+class WelfordStats:
+    def __init__(self, shape=()):
+        # Welford 線上平均／變異數；shape 為多串流時的陣列形狀
+        # shape=() 時以 Python float 儲存，逐筆更新不經過 NumPy
+        self.scalar = shape == ()
+        self.count = 0
+        self.mean = 0.0 if self.scalar else np.zeros(shape)
+        self.m2 = 0.0 if self.scalar else np.zeros(shape)
+
+    def update(self, x):
+        x = float(x) if self.scalar else np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (x - self.mean)
+
+    def update_batch(self, xs):
+        # 一次併入一批樣本（第 0 軸為時間），以 Chan 等人的合併公式計算
+        xs = np.asarray(xs, dtype=float)
+        n = xs.shape[0]
+        if n == 0:
+            return
+        batch_mean = xs.mean(axis=0)
+        batch_m2 = ((xs - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+class P2Quantile:
+    def __init__(self, q, shape=()):
+        # P² 分位數估計（Jain & Chlamtac）：每條串流只保留 5 個標記，記憶體固定
+        # shape=() 時標記存成 Python list，由 _update_scalar 逐筆更新
+        self.q = q
+        self.scalar = shape == ()
+        self.count = 0
+        self.heights = np.zeros(shape + (5,))
+        self.positions = np.broadcast_to(np.arange(5.0), shape + (5,)).copy()
+        self.desired = np.array([0.0, 2 * q, 4 * q, 2 + 2 * q, 4.0])
+        self.increments = np.array([0.0, q / 2, q, (1 + q) / 2, 1.0])
+        if self.scalar:
+            self.heights = self.heights.tolist()
+            self.positions = self.positions.tolist()
+            self.desired = self.desired.tolist()
+            self.increments = self.increments.tolist()
+
+    def update(self, x):
+        if self.scalar:
+            self._update_scalar(float(x))
+            return
+        x = np.asarray(x, dtype=float)
+        if self.count < 5:
+            self.heights[..., self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self.heights.sort(axis=-1)
+            return
+        self.count += 1
+        h, n = self.heights, self.positions
+        # 找出樣本落入的區間，並更新兩端標記
+        k = np.sum(x[..., None] >= h[..., 1:4], axis=-1)
+        h[..., 0] = np.minimum(h[..., 0], x)
+        h[..., 4] = np.maximum(h[..., 4], x)
+        n += np.arange(5) > k[..., None]
+        self.desired += self.increments
+        # 調整中間三個標記（拋物線插值，不單調時退回線性插值）
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[..., i]
+            step = np.where(((d >= 1) & (n[..., i + 1] - n[..., i] > 1)) |
+                            ((d <= -1) & (n[..., i - 1] - n[..., i] < -1)), np.sign(d), 0.0)
+            parabolic = h[..., i] + step / (n[..., i + 1] - n[..., i - 1]) * (
+                (n[..., i] - n[..., i - 1] + step) * (h[..., i + 1] - h[..., i]) / (n[..., i + 1] - n[..., i]) +
+                (n[..., i + 1] - n[..., i] - step) * (h[..., i] - h[..., i - 1]) / (n[..., i] - n[..., i - 1]))
+            neighbour_h = np.where(step > 0, h[..., i + 1], h[..., i - 1])
+            neighbour_n = np.where(step > 0, n[..., i + 1], n[..., i - 1])
+            linear = h[..., i] + step * (neighbour_h - h[..., i]) / (neighbour_n - n[..., i])
+            adjusted = np.where((h[..., i - 1] < parabolic) & (parabolic < h[..., i + 1]), parabolic, linear)
+            h[..., i] = np.where(step != 0, adjusted, h[..., i])
+            n[..., i] += step
+
+    def _update_scalar(self, x):
+        # 與 update 相同的演算法，逐項以 float 運算
+        h, n = self.heights, self.positions
+        if self.count < 5:
+            h[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                h.sort()
+            return
+        self.count += 1
+        k = (x >= h[1]) + (x >= h[2]) + (x >= h[3])
+        h[0] = min(h[0], x)
+        h[4] = max(h[4], x)
+        for j in range(k + 1, 5):
+            n[j] += 1
+        for j in range(5):
+            self.desired[j] += self.increments[j]
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if not ((d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1)):
+                continue
+            step = 1.0 if d > 0 else -1.0
+            parabolic = h[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+            if h[i - 1] < parabolic < h[i + 1]:
+                h[i] = parabolic
+            else:
+                j = i + 1 if step > 0 else i - 1
+                h[i] = h[i] + step * (h[j] - h[i]) / (n[j] - n[i])
+            n[i] += step
+
+    def update_batch(self, xs):
+        for x in np.asarray(xs, dtype=float):
+            self.update(x)
+
+    @property
+    def value(self):
+        if self.scalar:
+            return float(np.quantile(self.heights[:max(self.count, 1)], self.q)) if self.count < 5 else self.heights[2]
+        if self.count < 5:
+            return np.quantile(self.heights[..., :max(self.count, 1)], self.q, axis=-1)
+        return self.heights[..., 2].copy()
+
+class EWMAControl:
+    def __init__(self, alpha=0.05, limit=3.0, warmup=20, shape=()):
+        # 指數加權平均／變異數的管制界限：超出 mean ± limit·σ 即視為異常
+        self.alpha = alpha
+        self.limit = limit
+        self.warmup = warmup
+        self.scalar = shape == ()
+        self.count = 0
+        self.mean = 0.0 if self.scalar else np.zeros(shape)
+        self.var = 0.0 if self.scalar else np.zeros(shape)
+
+    def update(self, x):
+        # 先以更新前的界限判斷是否異常，再併入新樣本
+        if self.scalar:
+            return self._update_scalar(float(x))
+        x = np.asarray(x, dtype=float)
+        if self.count == 0:
+            self.mean = self.mean + x
+            self.count = 1
+            return np.zeros(x.shape, dtype=bool)
+        diff = x - self.mean
+        alarm = (np.abs(diff) > self.limit * np.sqrt(self.var)) & (self.count >= self.warmup)
+        increment = self.alpha * diff
+        self.mean = self.mean + increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+        return alarm
+
+    def _update_scalar(self, x):
+        if self.count == 0:
+            self.mean += x
+            self.count = 1
+            return False
+        diff = x - self.mean
+        alarm = abs(diff) > self.limit * math.sqrt(self.var) and self.count >= self.warmup
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+        self.count += 1
+        return alarm
+
+    def update_batch(self, xs):
+        return np.array([self.update(x) for x in np.asarray(xs, dtype=float)])
+
+    @property
+    def bounds(self):
+        sigma = np.sqrt(self.var)
+        return self.mean - self.limit * sigma, self.mean + self.limit * sigma
+
+class FieldMonitor:
+    def __init__(self, shape=(), quantiles=(0.01, 0.5, 0.99), alpha=0.05, limit=3.0, warmup=20):
+        # 監控預測誤差與場狀態：Welford 統計、P² 分位數與 EWMA 管制界限
+        # shape=(n_streams,) 時可直接搭配 MultiStreamEngine 使用；shape=() 時各元件走純 float 路徑
+        self.scalar = shape == ()
+        self.stats = {name: WelfordStats(shape) for name in ('error', 'field')}
+        self.quantiles = {name: {q: P2Quantile(q, shape) for q in quantiles} for name in ('error', 'field')}
+        self.control = {name: EWMAControl(alpha, limit, warmup, shape) for name in ('error', 'field')}
+
+    def update(self, prediction, data, field_state):
+        # 回傳 (誤差是否異常, 場狀態是否異常)
+        if self.scalar:
+            values = {'error': float(prediction) - float(data), 'field': float(field_state)}
+        else:
+            values = {'error': np.asarray(prediction) - np.asarray(data), 'field': np.asarray(field_state, dtype=float)}
+        alarms = {}
+        for name, x in values.items():
+            self.stats[name].update(x)
+            for estimator in self.quantiles[name].values():
+                estimator.update(x)
+            alarms[name] = self.control[name].update(x)
+        return alarms['error'], alarms['field']
+
+    def summary(self, name):
+        return {
+            'mean': self.stats[name].mean,
+            'std': self.stats[name].std,
+            'quantiles': {q: estimator.value for q, estimator in self.quantiles[name].items()},
+            'bounds': self.control[name].bounds,
+        }
+
+class MultiStreamEngine:
+    def __init__(self, n_streams, weight=0.5, lr=0.01, noise=0.1, seed=None):
+        # 結構陣列（SoA）：每條串流的索引、模型權重與場狀態各存成一個 NumPy 陣列
+        self.n_streams = n_streams
+        self.lr = lr
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.index = np.zeros(n_streams, dtype=np.int64)
+        self.weight = np.full(n_streams, weight, dtype=np.float64)
+        self.field_state = np.zeros(n_streams, dtype=np.float64)
+
+    def step(self, streams=None, data=None):
+        # 一次向量化推進 K 條串流；streams 為索引陣列（None 表示全部）
+        # data 可傳入外部量測值，否則與 RealTimeDataStream 相同方式產生
+        # 索引不可重複：花式索引賦值時重複的串流只會保留最後一次更新
+        sel = slice(None) if streams is None else np.asarray(streams)
+        index = self.index[sel]
+        if streams is not None and sel.dtype != bool and np.unique(sel % self.n_streams).size != sel.size:
+            raise ValueError("streams contains duplicate indices")
+        if data is None:
+            data = np.sin(0.1 * index) + self.rng.normal(scale=self.noise, size=index.shape)
+        weight = self.weight[sel]
+        # 等同 SimpleAIModel.predict / PredictiveField.update_field / SimpleAIModel.update
+        prediction = weight * data
+        self.field_state[sel] = 0.8 * self.field_state[sel] + 0.1 * (prediction + data)
+        self.weight[sel] = weight - self.lr * (prediction - data) * data
+        self.index[sel] = index + 1
+        return data, prediction
+
+def benchmark_multistream(n_streams=100000, ticks=100, active=None, seed=0):
+    # 每個 tick 更新 active 條串流（None 表示全部），回報每秒串流更新數
+    engine = MultiStreamEngine(n_streams, seed=seed)
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    for _ in range(ticks):
+        streams = None if active is None else rng.choice(n_streams, active, replace=False)
+        engine.step(streams)
+    elapsed = time.perf_counter() - start
+    updates = ticks * (n_streams if active is None else active)
+    print(f"MultiStream | {n_streams} streams | {updates / elapsed:,.0f} stream-updates/s | "
+          f"{elapsed / ticks * 1e3:.3f} ms/tick")
+    return engine
+
+class RingBuffer:
+    def __init__(self, capacity, dtype=float):
+        # 固定容量環形緩衝：每個值寫兩次，可用連續切片取得視窗（零複製）
+        self.capacity = capacity
+        self._buffer = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0
+        self._size = 0
+
+    def append(self, value):
+        self._buffer[self._head] = value
+        self._buffer[self._head + self.capacity] = value
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def view(self):
+        # 依時間順序回傳最近 size 筆資料的視圖
+        start = self._head + self.capacity - self._size
+        return self._buffer[start:start + self._size]
+
+    def __len__(self):
+        return self._size
+
+class LatencyHistogram:
+    def __init__(self, sub_bucket_bits=5):
+        # HDR 風格對數線性分桶（單位 ns）：每個 2 的冪次再分 2^(bits-1) 格，相對誤差約 3%
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.counts = [0] * (self.sub_bucket_count + (64 - sub_bucket_bits) * self.half_count)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (shift - 1) * self.half_count + (value >> shift) - self.half_count
+
+    def _value(self, index):
+        # 分桶的下界
+        if index < self.sub_bucket_count:
+            return index
+        shift, offset = divmod(index - self.sub_bucket_count, self.half_count)
+        return (offset + self.half_count) << (shift + 1)
+
+    def record(self, value):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if self.count == 0:
+            return 0
+        target = max(1, int(np.ceil(q / 100 * self.count)))
+        seen = 0
+        for index, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                # 回傳分桶中點
+                return min((self._value(index) + self._value(index + 1)) // 2, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1e3 if self.count else 0.0,
+            'p50_us': self.percentile(50) / 1e3,
+            'p99_us': self.percentile(99) / 1e3,
+            'max_us': self.max / 1e3,
+        }
+
+class StageProfiler:
+    def __init__(self):
+        # 各階段以單調時鐘計時，lap() 記錄上一個時間點到現在的耗時
+        self.histograms = {}
+        self.frames = 0
+        self.start = time.perf_counter_ns()
+
+    def clock(self):
+        return time.perf_counter_ns()
+
+    def lap(self, stage, t0):
+        now = time.perf_counter_ns()
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(now - t0)
+        return now
+
+    def tick(self):
+        self.frames += 1
+
+    def throughput(self):
+        elapsed = (time.perf_counter_ns() - self.start) / 1e9
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def report(self):
+        print(f"{'Stage':<10} {'count':>7} {'p50 us':>9} {'p99 us':>9} {'max us':>9}")
+        for stage, s in self.summary().items():
+            print(f"{stage:<10} {s['count']:>7d} {s['p50_us']:>9.1f} {s['p99_us']:>9.1f} {s['max_us']:>9.1f}")
+        print(f"Throughput: {self.throughput():.1f} frames/s")
+
+    def dump(self, path):
+        # 依副檔名輸出 JSON 或 CSV
+        summary = self.summary()
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['stage', 'count', 'mean_us', 'p50_us', 'p99_us', 'max_us'])
+                for stage, s in summary.items():
+                    writer.writerow([stage, s['count'], s['mean_us'], s['p50_us'], s['p99_us'], s['max_us']])
+        else:
+            with open(path, 'w') as f:
+                json.dump({'stages': summary, 'frames': self.frames,
+                           'throughput_fps': self.throughput()}, f, indent=2)
+
+# 二進位紀錄檔格式：8 位元組檔頭 + 固定長度紀錄
+LOG_MAGIC = b'RTSLOG1\0'
+LOG_DTYPE = np.dtype([('timestamp', '<f8'), ('index', '<i8'), ('data', '<f8'),
+                      ('prediction', '<f8'), ('field_state', '<f8')])
+
+class StreamLogWriter:
+    def __init__(self, path, chunk=4096):
+        # 以區塊緩衝附加寫入，避免每筆資料都觸發一次系統呼叫
+        self.path = path
+        self._file = open(path, 'wb')
+        self._file.write(LOG_MAGIC)
+        self._buffer = np.zeros(chunk, dtype=LOG_DTYPE)
+        self._size = 0
+        self.records = 0
+
+    def append(self, index, data, prediction, field_state, timestamp=None):
+        self._buffer[self._size] = (time.time() if timestamp is None else timestamp,
+                                    index, data, prediction, field_state)
+        self._size += 1
+        self.records += 1
+        if self._size == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        self._file.write(self._buffer[:self._size].tobytes())
+        self._file.flush()
+        self._size = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+class StreamLogReplayer:
+    def __init__(self, path):
+        # 以記憶體映射讀取紀錄檔，不需一次載入整個檔案
+        with open(path, 'rb') as f:
+            if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+                raise ValueError(f"{path} is not a stream log")
+        self.records = np.memmap(path, dtype=LOG_DTYPE, mode='r', offset=len(LOG_MAGIC))
+
+    def __len__(self):
+        return len(self.records)
+
+    def replay(self, model=None, field=None, pace=None):
+        # 將紀錄的資料重新送入模型與場；pace=None 為全速，
+        # pace=1.0 依原始時間間隔播放（2.0 為兩倍速，以此類推）
+        model = model or SimpleAIModel()
+        field = field or PredictiveField()
+        timestamps = self.records['timestamp']
+        data = self.records['data']
+        predictions = np.empty(len(data))
+        field_states = np.empty(len(data))
+        start = time.perf_counter()
+        for i, x in enumerate(data.tolist()):
+            if pace:
+                delay = start + (timestamps[i] - timestamps[0]) / pace - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            prediction = model.predict(x)
+            field.update_field(prediction, x)
+            model.update(x, x)
+            predictions[i] = prediction
+            field_states[i] = field.field_state
+        elapsed = time.perf_counter() - start
+        return {
+            'prediction': predictions,
+            'field_state': field_states,
+            'rmse': float(np.sqrt(np.mean((predictions - data) ** 2))) if len(data) else 0.0,
+            'samples_per_s': len(data) / elapsed if elapsed > 0 else 0.0,
+        }
+
+class FrameRecorder:
+    def __init__(self, fig, filename='realtime_simulation.mp4', fps=10, dpi=100):
+        # 單次模擬中逐格寫入 FFmpeg，不再由 ani.save 重跑 update()
+        self.writer = FFMpegWriter(fps=fps)
+        self.writer.setup(fig, filename, dpi=dpi)
+        self.frames = 0
+        self.finished = False
+
+    def grab(self):
+        if not self.finished:
+            self.writer.grab_frame()
+            self.frames += 1
+
+    def finish(self):
+        # 可重複呼叫：最後一格或關閉視窗時都會觸發
+        if not self.finished:
+            self.writer.finish()
+            self.finished = True
+
+class ProfiledAnimation(FuncAnimation):
+    def __init__(self, *args, profiler=None, **kwargs):
+        # update() 回傳後 FuncAnimation 才進行 blit 繪製，在此計時記為 'draw' 階段
+        self.profiler = profiler
+        super().__init__(*args, **kwargs)
+
+    def _post_draw(self, framedata, blit):
+        t0 = self.profiler.clock()
+        super()._post_draw(framedata, blit)
+        self.profiler.lap('draw', t0)
+
+def main_simulation(steps=100, record=True, headless=False, filename='realtime_simulation.mp4', history=None,
+                    log_every=1, profile=None, seed=None, log=None, model=None, monitor=False):
+    # headless=True 時不開 GUI，只逐格算一次並寫入影片
+    if headless:
+        plt.switch_backend('Agg')
+
     # 初始化模擬物件
-    data_stream = RealTimeDataStream()
-    model = SimpleAIModel()
+    data_stream = RealTimeDataStream(seed=seed)
+    # model 可替換為 RLSModel / KalmanModel / ARModel 等相同介面的模型
+    model = model or SimpleAIModel()
     field = PredictiveField()
 
-    # 初始化數據儲存
-    data_history = []
-    pred_history = []
-    field_history = []
-    step_history = []
+    # monitor=True 時以常數記憶體統計監控誤差與場狀態，超出管制界限即警示
+    field_monitor = FieldMonitor() if monitor else None
+
+    # log 指定路徑時記錄每筆資料、預測與場狀態，供 StreamLogReplayer 重播
+    log_writer = StreamLogWriter(log) if log is not None else None
+    if log_writer is not None:
+        atexit.register(log_writer.close)
+
+    # 初始化數據儲存（X 軸最多顯示 steps 格，只保留可見視窗）
+    history = history or steps
+    data_history = RingBuffer(history)
+    pred_history = RingBuffer(history)
+    field_history = RingBuffer(history)
+    step_history = RingBuffer(history, dtype=np.int64)
 
     # 設定圖表
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -65,39 +706,271 @@ def main_simulation(steps=100):
     line_field, = ax.plot([], [], 'g-', label='Field State', linewidth=2)
     ax.legend(loc='upper left')
 
+    # 各階段延遲統計；profile 指定 .json/.csv 路徑時於結束時輸出
+    profiler = StageProfiler()
+    if profile is not None:
+        atexit.register(profiler.dump, profile)
+        atexit.register(profiler.report)
+
+    # 影片錄製器（需要 FFmpeg）
+    recorder = FrameRecorder(fig, filename) if record else None
+
+    # 錄影的 grab_frame 與 headless 的 fig.canvas.draw() 都會完整繪製一次，
+    # Figure.draw 結束時觸發 draw_event，由此把繪製與編碼分開計時
+    draw_start = [None]
+
+    def on_draw(event):
+        if draw_start[0] is not None:
+            draw_start[0] = profiler.lap('draw', draw_start[0])
+
+    fig.canvas.mpl_connect('draw_event', on_draw)
+
+    def init():
+        # 提供 init_func，避免 FuncAnimation 為初始畫面多呼叫一次 update(0)
+        return line_data, line_pred, line_field
+
     def update(frame):
         # 獲取新數據
+        t0 = profiler.clock()
         data = data_stream.get_next_data()
+        t0 = profiler.lap('generate', t0)
         prediction = model.predict(data)
+        t0 = profiler.lap('predict', t0)
         field.update_field(prediction, data)
+        t0 = profiler.lap('field', t0)
         model.update(data, data)
+        t0 = profiler.lap('update', t0)
+        if log_writer is not None:
+            log_writer.append(frame, data, prediction, field.field_state)
+            t0 = profiler.lap('log', t0)
+        if field_monitor is not None:
+            error_alarm, field_alarm = field_monitor.update(prediction, data, field.field_state)
+            if error_alarm or field_alarm:
+                print(f"Step {frame:3d} | ALERT | error out of band: {bool(error_alarm)} | field out of band: {bool(field_alarm)}")
+            t0 = profiler.lap('monitor', t0)
 
         # 儲存歷史數據
         step_history.append(frame)
         data_history.append(data)
         pred_history.append(prediction)
         field_history.append(field.field_state)
+        t0 = profiler.lap('history', t0)
 
         # 更新折線數據
-        line_data.set_data(step_history, data_history)
-        line_pred.set_data(step_history, pred_history)
-        line_field.set_data(step_history, field_history)
+        steps_view = step_history.view()
+        line_data.set_data(steps_view, data_history.view())
+        line_pred.set_data(steps_view, pred_history.view())
+        line_field.set_data(steps_view, field_history.view())
 
         # 動態調整 X 軸範圍
         if frame > steps // 2:
             ax.set_xlim(frame - steps // 2, frame + steps // 2)
+        t0 = profiler.lap('artists', t0)
+
+        # 輸出當前狀態（log_every > 1 時抽樣輸出，避免 print 成為瓶頸）
+        if log_every and frame % log_every == 0:
+            print(f"Step {frame:3d} | Data: {data:.3f} | Prediction: {prediction:.3f} | Field State: {field.field_state:.3f}")
+            t0 = profiler.lap('print', t0)
 
-        # 輸出當前狀態
-        print(f"Step {frame:3d} | Data: {data:.3f} | Prediction: {prediction:.3f} | Field State: {field.field_state:.3f}")
+        # 同一次計算的畫面直接寫入影片；'record' 只計繪製之後的編碼與寫入
+        if recorder is not None:
+            draw_start[0] = t0
+            recorder.grab()
+            t0 = profiler.lap('record', draw_start[0])
+            draw_start[0] = None
+        elif headless and profile is not None:
+            # headless 不錄影時原本不繪製；量測時仍繪製一次，'draw' 階段才有意義
+            draw_start[0] = t0
+            fig.canvas.draw()
+            t0 = draw_start[0]
+            draw_start[0] = None
 
+        if frame == steps - 1:
+            finish()
+        profiler.tick()
         return line_data, line_pred, line_field
 
-    # 生成動畫
-    ani = FuncAnimation(fig, update, frames=steps, interval=100, blit=True)
+    def finish(event=None):
+        # 最後一格或提前關閉視窗時結束影片並寫出紀錄檔（皆可重複呼叫），
+        # 同一程序內的 StreamLogReplayer 才讀得到完整紀錄
+        if recorder is not None:
+            recorder.finish()
+        if log_writer is not None:
+            log_writer.close()
 
-    # 保存動畫為 MP4（需要 FFmpeg）並顯示
-    ani.save('realtime_simulation.mp4', writer='ffmpeg', dpi=100)
+    if headless:
+        # 無 GUI：每一格只計算並繪製一次，輸出可重現
+        for frame in range(steps):
+            update(frame)
+        finish()
+        plt.close(fig)
+        return
+
+    # 生成動畫（repeat=False 避免重播時再次推進模型狀態）
+    # GUI 錄影時每格繪製兩次（錄影一次、螢幕 blit 一次），'draw' 階段各記一筆
+    ani = ProfiledAnimation(fig, update, frames=steps, init_func=init, interval=100, blit=True, repeat=False,
+                            profiler=profiler)
+
+    # 提前關閉視窗時也要正確結束影片檔與紀錄檔
+    fig.canvas.mpl_connect('close_event', finish)
     plt.show()
 
+class StageQueue:
+    # 有界佇列，滿載時依策略處理：
+    # 'block' 反壓（上游等待）、'drop_newest' 丟棄新資料、
+    # 'drop_oldest' 丟棄最舊資料、'coalesce' 只保留最新一筆
+    POLICIES = ('block', 'drop_newest', 'drop_oldest', 'coalesce')
+
+    def __init__(self, maxsize=64, policy='block'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overload policy: {policy}")
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.dropped = 0
+
+    async def put(self, item):
+        if self.policy == 'block' or not self.queue.full():
+            await self.queue.put(item)
+            return
+        if self.policy == 'drop_newest':
+            self.dropped += 1
+            return
+        # drop_oldest 丟一筆騰出空間；coalesce 清空後只留最新值
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.policy == 'drop_oldest':
+                break
+        self.queue.put_nowait(item)
+
+    async def close(self):
+        # 結束標記不可被丟棄，一律等待放入
+        await self.queue.put(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+async def synthetic_source(data_stream, count, rate=None):
+    # 以 RealTimeDataStream 產生資料，rate 為每秒筆數（None 表示全速）
+    # 依時鐘排程：下游卡住時會像真實感測器一樣累積並爆發送出
+    start = time.perf_counter()
+    for i in range(count):
+        index = data_stream.current_index
+        yield index, data_stream.get_next_data()
+        if rate is None:
+            await asyncio.sleep(0)
+            continue
+        delay = start + (i + 1) / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+async def socket_source(host='127.0.0.1', port=8765, path=None):
+    # 讀取 TCP 或 UNIX socket 上以換行分隔的浮點數，模擬真實感測器串流
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    index = 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            yield index, float(line)
+            index += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def serve_stream(count=1000, rate=None, host='127.0.0.1', port=8765, path=None):
+    # 本機資料來源伺服器，每個連線送出 count 筆資料後關閉，用於壓力測試
+    async def handle(reader, writer):
+        data_stream = RealTimeDataStream()
+        async for _, value in synthetic_source(data_stream, count, rate):
+            writer.write(f"{value:.6f}\n".encode())
+            await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path)
+    return await asyncio.start_server(handle, host, port)
+
+async def run_pipeline(source, model=None, field=None, render=None, queue_size=64, policy='block', render_policy='coalesce'):
+    # 三階段管線：producer -> predictor/updater -> renderer，以有界佇列相連
+    model = model or SimpleAIModel()
+    field = field or PredictiveField()
+    samples = StageQueue(queue_size, policy)
+    results = StageQueue(queue_size, render_policy)
+    stats = {'received': 0, 'processed': 0, 'rendered': 0}
+
+    async def producer():
+        async for item in source:
+            stats['received'] += 1
+            await samples.put(item)
+        await samples.close()
+
+    async def predictor():
+        while True:
+            item = await samples.get()
+            if item is None:
+                break
+            index, data = item
+            prediction = model.predict(data)
+            field.update_field(prediction, data)
+            model.update(data, data)
+            stats['processed'] += 1
+            await results.put((index, data, prediction, field.field_state))
+        await results.close()
+
+    async def renderer():
+        while True:
+            item = await results.get()
+            if item is None:
+                break
+            if render is not None:
+                # render 在工作執行緒中執行，繪圖期間事件迴圈仍可讀取 socket、推進上游
+                await asyncio.to_thread(render, *item)
+            stats['rendered'] += 1
+            # 讓出事件迴圈，避免繪圖階段獨占
+            await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(producer(), predictor(), renderer())
+    stats['elapsed'] = time.perf_counter() - start
+    stats['dropped_samples'] = samples.dropped
+    stats['dropped_frames'] = results.dropped
+    return stats
+
+def main_pipeline(count=1000, rate=None, source='synthetic', host='127.0.0.1', port=8765, path=None,
+                  queue_size=64, policy='block', render_policy='coalesce', render=None):
+    # source='synthetic' 直接產生資料；'tcp'/'unix' 會在本機啟動資料伺服器並經 socket 讀取
+    if source not in ('synthetic', 'tcp', 'unix'):
+        raise ValueError(f"Unknown source: {source}")
+    if source == 'unix' and not path:
+        raise ValueError("source='unix' requires a socket path")
+
+    async def run():
+        server = None
+        if source == 'synthetic':
+            stream = synthetic_source(RealTimeDataStream(), count, rate)
+        else:
+            unix_path = path if source == 'unix' else None
+            server = await serve_stream(count, rate, host, port, unix_path)
+            stream = socket_source(host, port, unix_path)
+        try:
+            return await run_pipeline(stream, render=render, queue_size=queue_size,
+                                      policy=policy, render_policy=render_policy)
+        finally:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+    stats = asyncio.run(run())
+    print(f"Pipeline | received {stats['received']} | processed {stats['processed']} | "
+          f"rendered {stats['rendered']} | dropped {stats['dropped_samples']}/{stats['dropped_frames']} | "
+          f"{stats['processed'] / stats['elapsed']:.0f} samples/s")
+    return stats
+
 if __name__ == "__main__":
     main_simulation()
@@ -1,4 +1,5 @@
 import numpy as np
+import json
 import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 
@@ -14,6 +15,12 @@ plt.rcParams['axes.unicode_minus'] = False
 # Parameters
 N, T, dt = 6, 200, 0.1  
 lambda_, k = 0.5, 0.3  # Increase k value to strengthen fiscal shock impact
+ENSEMBLE_SIZE = 0  # Monte Carlo ensemble members (0 disables the ensemble run)
+CALIBRATE = False  # Fit A, lambda_ and k to the target data points instead of blending towards them
+CALIBRATION_WORKERS = 0  # Worker processes for scoring calibration candidates (0 scores in-process)
+SPARSE_ACTORS = 0  # Total actors for the sparse large-N network run (0 disables it)
+ADAPTIVE = False  # Also solve the deterministic field with adaptive Dormand-Prince (dashed curves)
+SCENARIO_PATH = None  # JSON file with a what-if scenario replacing the built-in one (same schema)
 
 # Initial power field - starting values closer to requirements
 phi = np.zeros((N, T))
@@ -30,162 +37,519 @@ A = np.array([
     [-0.3, -0.1, -0.1, -0.4, -0.3,  0.1]   # Communist Party Conservatives: brief rise in 1991 then decline
 ])
 
-# Pre-calculate fiscal bankruptcy impact - make collapse more obvious
-fiscal_impact = np.zeros(T)
-for t in range(T):
-    time = t * dt
-    if time < 5:  # Before 1985-1990
-        fiscal_impact[t] = -0.01 * time * 10
-    elif 5 <= time < 10:  # Around 1990
-        fiscal_impact[t] = -0.5 - 0.05 * (time - 5) * 10
-    elif 10 <= time < 15:  # 1990-1991
-        fiscal_impact[t] = -0.75 - 0.05 * (time - 10) * 10
-    else:  # After 1991
-        fiscal_impact[t] = -1.0
-
-# Add temporary rise effect of Communist Party conservatives
-conservative_surge = np.zeros(T)
-for t in range(T):
-    time = t * dt
-    if 14 <= time < 15.5:  # Around 1991 dissolution
-        conservative_surge[t] = 2.0
-    else:
-        conservative_surge[t] = 0.0
-
-# Numerical calculation (Euler method) - add special event impacts
-for t in range(T-1):
-    # Basic evolution
-    dphi = dt * (
-        -lambda_ * phi[:, t] * (phi[:, t]**2 - 1) +  # Non-linear term
-        (A @ phi[:, t] - np.diag(A) * phi[:, t]) +   # Diffusion term
-        0.005 * np.random.randn(N)                   # Reduced noise
-    )
-    
-    # Add fiscal shock impact (mainly affecting Soviet government)
-    dphi[0] += dt * k * fiscal_impact[t]
-    
-    # Add temporary rise of Communist Party conservatives in 1991
-    dphi[5] += dt * 0.5 * conservative_surge[t]
-    
-    # Ensure Russian Federation rises after Soviet dissolution
-    if 15 <= t * dt < 20:  # After 1991 dissolution
-        dphi[1] += dt * 0.3  # Russian Federation power increases
-    
-    # Ensure USA and Eastern European countries slowly strengthen
-    if t * dt >= 5:  # After 1990
-        dphi[2] += dt * 0.03  # Eastern European countries slowly strengthen
-        dphi[3] += dt * 0.04  # USA slowly strengthens
-    
-    # Update and ensure power is non-negative
-    phi[:, t+1] = np.maximum(phi[:, t] + dphi, 0)
-    
-    # Specific moment adjustments to ensure compliance with specified data points
-    if abs(t - 50) < 1:  # Around 1990 (t=50)
-        target = np.array([0.65, 0.25, 0.30, 0.45, 0.20, 0.15])
-        phi[:, t+1] = 0.9 * phi[:, t+1] + 0.1 * target
-    
-    if abs(t - 150) < 1:  # Around 1991 dissolution (t=150)
-        target = np.array([0.02, 0.60, 0.50, 0.70, 0.10, 0.05])
-        phi[:, t+1] = 0.8 * phi[:, t+1] + 0.2 * target
-
-# Visualization
-plt.style.use('ggplot')
-fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), gridspec_kw={'height_ratios': [3, 1]})
-
-# Title
-fig.suptitle("Power Evolution During Soviet Union Dissolution (1985-1995)", fontsize=14, fontweight='bold', y=0.97)
-
-# Power change chart
-years = np.linspace(1985, 1995, T)
 labels = ["Soviet Government", "Russian Federation", "Eastern European Countries", "USA", "Soviet Military", "Communist Party Conservatives"]
-colors = ['#D62728', '#1F77B4', '#FF7F0E', '#2CA02C', '#9467BD', '#8C564B']
 
-for i in range(N):
-    ax1.plot(years, phi[i, :], label=labels[i], color=colors[i], linewidth=2)
+# Scenario: time-windowed forcings per actor plus target blends, all as data.
+# Forcing windows are in model time (step * dt): start inclusive, end exclusive (omitted = open-ended).
+# Within a window the forcing is value + slope * (time - start); 'scale' names a model parameter
+# (e.g. 'k') the forcing is multiplied by. Nudges blend the state reached after `step` towards `target`.
+scenario = {
+    'forcings': [
+        # Fiscal bankruptcy impact on the Soviet government, scaled by k - make collapse more obvious
+        {'actor': "Soviet Government", 'start': 0, 'end': 5, 'slope': -0.1, 'scale': 'k'},  # Before 1985-1990
+        {'actor': "Soviet Government", 'start': 5, 'end': 10, 'value': -0.5, 'slope': -0.5, 'scale': 'k'},  # Around 1990
+        {'actor': "Soviet Government", 'start': 10, 'end': 15, 'value': -0.75, 'slope': -0.5, 'scale': 'k'},  # 1990-1991
+        {'actor': "Soviet Government", 'start': 15, 'value': -1.0, 'scale': 'k'},  # After 1991
+        # Temporary rise of Communist Party conservatives around the 1991 dissolution
+        {'actor': "Communist Party Conservatives", 'start': 14, 'end': 15.5, 'value': 1.0},
+        # Russian Federation rises after Soviet dissolution
+        {'actor': "Russian Federation", 'start': 15, 'end': 20, 'value': 0.3},
+        # USA and Eastern European countries slowly strengthen after 1990
+        {'actor': "Eastern European Countries", 'start': 5, 'value': 0.03},
+        {'actor': "USA", 'start': 5, 'value': 0.04},
+    ],
+    # Specific moment adjustments to ensure compliance with specified data points
+    'nudges': [
+        {'step': 50, 'weight': 0.1, 'target': [0.65, 0.25, 0.30, 0.45, 0.20, 0.15]},   # Around 1990 (t=50)
+        {'step': 150, 'weight': 0.2, 'target': [0.02, 0.60, 0.50, 0.70, 0.10, 0.05]},  # Around 1991 dissolution (t=150)
+    ],
+}
+
+# Model parameters a forcing may be scaled by
+SCALE_PARAMETERS = ('k', 'lambda_')
+
+# Compile a scenario once into dense (T, N) forcing layers keyed by scale parameter (None = unscaled)
+# and a {step: (weight, target)} blend table
+def compile_scenario(scenario, steps=T):
+    times = np.arange(steps) * dt
+    layers = {None: np.zeros((steps, N))}
+    for forcing in scenario.get('forcings', []):
+        actor = forcing['actor']
+        actor = labels.index(actor) if isinstance(actor, str) else actor
+        scale = forcing.get('scale')
+        if scale is not None and scale not in SCALE_PARAMETERS:
+            raise ValueError(f"Unknown forcing scale {scale!r}; expected one of {SCALE_PARAMETERS}")
+        start = forcing.get('start', 0)
+        window = (times >= start) & (times < forcing.get('end', np.inf))
+        layer = layers.setdefault(scale, np.zeros((steps, N)))
+        layer[window, actor] += forcing.get('value', 0.0) + forcing.get('slope', 0.0) * (times[window] - start)
+    nudges = {item['step']: (item['weight'], np.array(item['target'], dtype=float))
+              for item in scenario.get('nudges', [])}
+    return layers, nudges
+
+if SCENARIO_PATH:
+    with open(SCENARIO_PATH, encoding='utf-8') as f:
+        scenario = json.load(f)
+forcing_layers, target_nudges = compile_scenario(scenario)
+fiscal_impact = forcing_layers.get('k', np.zeros((T, N)))[:, 0]  # Fiscal pressure chart
+
+# Dense (T, N) external forcing for the given scale parameters (default: the current k and lambda_)
+def scenario_forcing(parameters=None):
+    parameters = {'k': k, 'lambda_': lambda_} if parameters is None else parameters
+    return sum(layer if scale is None else parameters[scale] * layer for scale, layer in forcing_layers.items())
+
+# Monte Carlo ensemble: M noisy trajectories advance together as one (M, N) array, with a single
+# batched A @ phi per step. Full paths are never stored, only per-step quantile bands (Q, N, T) and,
+# for each event {name: (actor, 'below' or 'above', threshold, by_step)}, the first step each member
+# crosses the threshold (-1 if never). Returns bands, event probabilities and first-passage steps.
+def simulate_ensemble(M, events=None, quantiles=(0.05, 0.5, 0.95), noise=0.005, seed=None):
+    rng = np.random.default_rng(seed)
+    events = events or {}
+    state = np.tile(phi[:, 0], (M, 1))
+    diag = np.diag(A)
+    forcing = scenario_forcing()
+    bands = np.empty((len(quantiles), N, T))
+    first_passage = {name: np.full(M, -1, dtype=np.int32) for name in events}
+
+    def record(step):
+        bands[:, :, step] = np.quantile(state, quantiles, axis=0)
+        for name, (actor, side, threshold, _) in events.items():
+            hit = state[:, actor] < threshold if side == 'below' else state[:, actor] > threshold
+            first_passage[name][hit & (first_passage[name] < 0)] = step
+
+    record(0)
+    for t in range(T-1):
+        dphi = state @ A.T - diag * state
+        dphi -= lambda_ * state * (state**2 - 1)
+        dphi += noise * rng.standard_normal((M, N)) + forcing[t]
+        state = np.maximum(state + dt * dphi, 0)
+        if t in target_nudges:
+            weight, target = target_nudges[t]
+            state = (1 - weight) * state + weight * target
+        record(t+1)
+
+    probabilities = {name: float(np.mean((first_passage[name] >= 0) & (first_passage[name] <= by_step)))
+                     for name, (_, _, _, by_step) in events.items()}
+    return bands, probabilities, first_passage
+
+# Target power distributions the calibration fits: step -> power of each actor
+calibration_targets = {step: target for step, (_, target) in target_nudges.items()}
+
+# Calibration parameter vector: the 36 entries of A, then lambda_, then k
+def pack_parameters(A, lambda_, k):
+    return np.concatenate([A.ravel(), [lambda_, k]])
+
+def unpack_parameters(params):
+    params = np.atleast_2d(params)
+    return params[:, :N * N].reshape(-1, N, N), np.maximum(params[:, -2], 0), np.maximum(params[:, -1], 0)
+
+# Deterministic batched integration of P parameter sets at once (no noise, no target blending):
+# As (P, N, N), lambdas (P,), ks (P,). Returns the power fields at `steps`, shape (P, len(steps), N)
+def integrate_batch(As, lambdas, ks, steps):
+    state = np.tile(phi[:, 0], (len(As), 1))
+    diag = np.einsum('pii->pi', As)
+    # Scaled forcing layers use each candidate's own parameter values
+    candidate = {'k': ks, 'lambda_': lambdas}
+    base = forcing_layers[None]
+    scaled = [(candidate[scale], layer) for scale, layer in forcing_layers.items() if scale is not None]
+    out = np.empty((len(As), len(steps), N))
+    slot = {step: i for i, step in enumerate(steps)}
+    if 0 in slot:
+        out[:, slot[0]] = state
+    with np.errstate(over='ignore', invalid='ignore'):
+        for t in range(max(steps)):
+            dphi = (As @ state[:, :, None])[:, :, 0] - diag * state
+            dphi -= lambdas[:, None] * state * (state**2 - 1)
+            dphi += base[t]
+            for values, layer in scaled:
+                dphi += values[:, None] * layer[t]
+            state = np.maximum(state + dt * dphi, 0)
+            if t + 1 in slot:
+                out[:, slot[t + 1]] = state
+    return out
+
+# Squared trajectory error against calibration_targets for a (P, N*N + 2) batch of parameter vectors,
+# plus a ridge term (prior) keeping A close to the hand-built matrix; diverging candidates score inf
+def calibration_error(params, prior=0.01):
+    As, lambdas, ks = unpack_parameters(params)
+    steps = sorted(calibration_targets)
+    fields = integrate_batch(As, lambdas, ks, steps)
+    targets = np.array([calibration_targets[step] for step in steps])
+    error = np.sum((fields - targets) ** 2, axis=(1, 2)) + prior * np.sum((As - A) ** 2, axis=(1, 2))
+    return np.where(np.isfinite(error), error, np.inf)
+
+# Gradient-free calibration by the cross-entropy method: every generation samples `population`
+# parameter sets around the current mean, scores them in one batched integration (split across
+# `workers` processes when workers > 0) and refits mean and spread to the best `elite` fraction.
+# Returns the best (A, lambda_, k) found and its error
+def calibrate(population=2000, generations=40, elite=0.05, sigma=0.1, workers=0, seed=None):
+    from concurrent.futures import ProcessPoolExecutor
+    rng = np.random.default_rng(seed)
+    mean = pack_parameters(A, lambda_, k)
+    spread = np.full(len(mean), sigma)
+    n_elite = max(int(population * elite), 2)
+    best_params, best_error = mean, calibration_error(mean)[0]
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    try:
+        for _ in range(generations):
+            candidates = mean + spread * rng.standard_normal((population, len(mean)))
+            if executor is not None:
+                errors = np.concatenate(list(executor.map(calibration_error, np.array_split(candidates, workers))))
+            else:
+                errors = calibration_error(candidates)
+            elites = candidates[np.argsort(errors)[:n_elite]]
+            mean, spread = elites.mean(axis=0), elites.std(axis=0) + 1e-4
+            if errors.min() < best_error:
+                best_params, best_error = candidates[np.argmin(errors)], errors.min()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    As, lambdas, ks = unpack_parameters(best_params)
+    return As[0], float(lambdas[0]), float(ks[0]), float(best_error)
+
+# Sparse actor network for thousands of regional and institutional actors: the six core actors keep
+# their block of A and every extra actor gets `degree` random signed couplings, mirrored so influence
+# is mutual (CSR, memory O(nnz)). Returns the sparse matrix and initial powers (core actors first)
+def build_actor_network(n_actors, degree=8, scale=0.1, seed=None):
+    from scipy import sparse
+    rng = np.random.default_rng(seed)
+    extra = np.repeat(np.arange(N, n_actors), degree)
+    partner = rng.integers(0, n_actors, len(extra))
+    coupling = scale * rng.standard_normal(len(extra))
+    core_rows, core_cols = np.nonzero(A)
+    rows = np.concatenate([core_rows, extra, partner])
+    cols = np.concatenate([core_cols, partner, extra])
+    values = np.concatenate([A[core_rows, core_cols], coupling, coupling])
+    network = sparse.csr_matrix((values, (rows, cols)), shape=(n_actors, n_actors))
+    power = np.concatenate([phi[:, 0], rng.uniform(0.05, 0.3, n_actors - N)])
+    return network, power
+
+# Euler integration on a sparse network: the diffusion term A @ phi - diag(A) * phi is one sparse
+# matvec with the off-diagonal part, so a step costs O(nnz + N). Noise is drawn `chunk` steps at a
+# time, the core actors receive the scenario forcing and target blending, and every record_every-th
+# step is written into a preallocated buffer. Returns (N, records) like phi, plus the recorded steps
+def simulate_sparse(network, power, steps=T, record_every=1, chunk=50, noise=0.005, seed=None):
+    from scipy import sparse
+    rng = np.random.default_rng(seed)
+    offdiag = (network - sparse.diags(network.diagonal())).tocsr()
+    forcing = scenario_forcing()
+    state = np.array(power, dtype=float)
+    recorded = np.arange(0, steps, record_every)
+    # Row per record keeps each write contiguous; the transpose is returned
+    records = np.empty((len(recorded), len(state)))
+    records[0] = state
+    for start in range(0, steps - 1, chunk):
+        stop = min(start + chunk, steps - 1)
+        shocks = rng.standard_normal((stop - start, len(state)))
+        shocks *= noise
+        for t in range(start, stop):
+            dphi = offdiag @ state
+            dphi -= lambda_ * state * (state * state - 1)
+            dphi += shocks[t - start]
+            dphi[:N] += forcing[t]
+            state += dt * dphi
+            np.maximum(state, 0, out=state)
+            if t in target_nudges:
+                weight, target = target_nudges[t]
+                state[:N] = (1 - weight) * state[:N] + weight * target
+            if (t + 1) % record_every == 0:
+                records[(t + 1) // record_every] = state
+    return records.T, recorded
+
+# Model time (step * dt) <-> calendar year, matching the plotted 1985-1995 axis
+def time_to_year(time):
+    return 1985 + 10 * np.asarray(time) / ((T - 1) * dt)
+
+def year_to_time(year):
+    return (np.asarray(year) - 1985) * (T - 1) * dt / 10
 
-# Historical events
-events = {1986.5: "Chernobyl", 1989: "Eastern Europe Changes", 1990: "Economic Crisis", 1991.17: "Soviet Dissolution", 1991.67: "CIS Formation"}
-for year, event in events.items():
-    ax1.axvline(x=year, color='gray' if year != 1991.17 else 'red', linestyle='--', alpha=0.6)
-    ax1.text(year + 0.1, 0.85, event, rotation=90, alpha=0.7, fontsize=9)
+# Continuous-time drift for a (N,) or (M, N) state; forcing is the compiled scenario table
+# linearly interpolated in time
+def make_drift():
+    table = scenario_forcing()
+    diag = np.diag(A)
 
-ax1.set_ylabel("Power Index ϕi(t)", fontsize=10)
-ax1.legend(loc='upper center', bbox_to_anchor=(0.5, -0.12), ncol=3, fontsize=9, frameon=True)
-ax1.set_xlim(1985, 1995)
-ax1.set_ylim(-0.1, 1.2)
+    def drift(time, state):
+        position = min(max(time / dt, 0), T - 1)
+        i = min(int(position), T - 2)
+        force = table[i] + (position - i) * (table[i + 1] - table[i])
+        return state @ A.T - diag * state - lambda_ * state * (state**2 - 1) + force
+    return drift
 
-# Mark key timepoints
-ax1.plot(1990, phi[0, 50], 'o', color='black', markersize=5)
-ax1.plot(1991.17, phi[0, 150], 'o', color='black', markersize=5)
-ax1.text(1990, phi[0, 50]+0.05, f"({phi[0, 50]:.2f})", fontsize=8)
-ax1.text(1991.17, phi[0, 150]+0.05, f"({phi[0, 150]:.2f})", fontsize=8)
+# Integration segments between target blends: the Euler loop blends the state reached at step t + 1
+def blend_segments(t_end):
+    cuts = sorted((step + 1) * dt for step in target_nudges if 0 < (step + 1) * dt < t_end)
+    return list(zip([0.0] + cuts, cuts + [t_end]))
 
-# Fiscal impact chart
-ax2.plot(years, k * fiscal_impact, color='darkred', linewidth=2)
-ax2.fill_between(years, k * fiscal_impact, 0, color='darkred', alpha=0.2)
-ax2.set_xlabel("Year", fontsize=10)
-ax2.set_ylabel("Fiscal Impact", fontsize=10)
-ax2.set_title("Soviet Fiscal Pressure Over Time", fontsize=11)
-ax2.set_xlim(1985, 1995)
+def apply_blend(time, state):
+    step = int(round(time / dt)) - 1
+    if step in target_nudges:
+        weight, target = target_nudges[step]
+        state = (1 - weight) * state + weight * target
+    return state
 
-plt.tight_layout()
-fig.subplots_adjust(hspace=0.2, top=0.92, bottom=0.15)
+# Adaptive Dormand-Prince (scipy RK45) solution of the deterministic field with dense output on `grid`
+# (model times, default yearly) and threshold events {name: (actor, 'below' or 'above', threshold, ...)}
+# located from the dense output. Non-negative power is a hybrid system rather than a clamp: an actor
+# reaching zero is pinned there by a terminal event and released when its drift turns positive, so
+# the right-hand side stays smooth between switches and steps can stay long.
+# Returns grid states (N, len(grid)), event years and the number of drift evaluations
+def integrate_adaptive(grid=None, events=None, rtol=1e-6, atol=1e-9, method='RK45', max_switches=1000):
+    from scipy.integrate import solve_ivp
+    t_end = (T - 1) * dt
+    grid = year_to_time(np.arange(1985, 1996)) if grid is None else np.asarray(grid)
+    events = events or {}
+    drift = make_drift()
+    crossings = []
+    for actor, side, threshold in (spec[:3] for spec in events.values()):
+        crossing = lambda time, state, actor=actor, threshold=threshold: state[actor] - threshold
+        crossing.direction = -1 if side == 'below' else 1
+        crossings.append(crossing)
+    state = phi[:, 0].astype(float)
+    out = np.empty((N, len(grid)))
+    event_years = {name: [] for name in events}
+    evaluations = switches = 0
+    for start, stop in blend_segments(t_end):
+        pinned = state <= 0
+        while True:
+            held = pinned.copy()
+            rhs = lambda time, y: np.where(held, 0.0, drift(time, y))
+            boundaries = []
+            for i in range(N):
+                if held[i]:
+                    boundary = lambda time, y, i=i: drift(time, y)[i]
+                else:
+                    boundary = lambda time, y, i=i: y[i]
+                boundary.terminal, boundary.direction = True, 1 if held[i] else -1
+                boundaries.append(boundary)
+            solution = solve_ivp(rhs, (start, stop), state, method=method, events=crossings + boundaries,
+                                 rtol=rtol, atol=atol, dense_output=True)
+            evaluations += solution.nfev
+            end = solution.t[-1]
+            inside = (grid >= start) & ((grid < end) | ((end == stop) & (stop == t_end) & (grid <= end)))
+            if inside.any():
+                out[:, inside] = np.maximum(solution.sol(grid[inside]), 0)
+            for name, times in zip(events, solution.t_events):
+                event_years[name].extend(time_to_year(times).tolist())
+            state = np.maximum(solution.y[:, -1], 0)
+            if solution.status != 1:
+                break
+            # Terminal event: pin the actor that reached zero, or release the one whose drift turned positive
+            for i, times in enumerate(solution.t_events[len(crossings):]):
+                if len(times):
+                    pinned[i] = not pinned[i]
+                    if pinned[i]:
+                        state[i] = 0.0
+            switches += 1
+            if switches > max_switches:
+                raise RuntimeError(f"More than {max_switches} zero-boundary switches before t={end:.3f}")
+            start = end
+        state = apply_blend(stop, state)
+    return out, event_years, evaluations
 
-# Output key time point data
-t_50 = 50  # 1990
-t_150 = 150  # 1991 dissolution
+# Stochastic path for M members: additive noise sigma * dW integrated with stochastic Heun
+# (strong order 1 for additive noise) or Euler-Maruyama, step h. The default sigma matches the Euler
+# loop's per-step noise (dt * noise) at h = dt. Returns states on `grid`, shape (M, N, len(grid))
+def integrate_stochastic(M, h=dt, method='heun', noise=0.005, sigma=None, grid=None, seed=None):
+    rng = np.random.default_rng(seed)
+    sigma = noise * np.sqrt(dt) if sigma is None else sigma
+    t_end = (T - 1) * dt
+    grid = year_to_time(np.arange(1985, 1996)) if grid is None else np.asarray(grid)
+    drift = make_drift()
+    state = np.tile(phi[:, 0], (M, 1))
+    out = np.empty((M, N, len(grid)))
+    # Steps land exactly on grid points and blend times
+    cuts = [stop for _, stop in blend_segments(t_end)[:-1]]
+    marks = np.unique(np.concatenate([[0.0, t_end], cuts, grid[(grid > 0) & (grid < t_end)]]))
+    for start, stop in zip(marks[:-1], marks[1:]):
+        out[:, :, np.isclose(grid, start)] = state[:, :, None]
+        n_steps = max(int(np.ceil((stop - start) / h - 1e-9)), 1)
+        step = (stop - start) / n_steps
+        for i in range(n_steps):
+            time = start + i * step
+            shock = sigma * np.sqrt(step) * rng.standard_normal((M, N))
+            rate = drift(time, state)
+            if method == 'heun':
+                predictor = np.maximum(state + step * rate + shock, 0)
+                state = state + 0.5 * step * (rate + drift(time + step, predictor)) + shock
+            else:
+                state = state + step * rate + shock
+            np.maximum(state, 0, out=state)
+        state = apply_blend(stop, state)
+    out[:, :, np.isclose(grid, t_end)] = state[:, :, None]
+    return out
 
-print("\n===== Key Time Point Data =====")
-print(f"1990 (t=50) Power Distribution: {phi[:, t_50].round(2)}")
-print(f"1991 Dissolution (t=150) Power Distribution: {phi[:, t_150].round(2)}")
+if __name__ == "__main__":
+    # Calibration replaces the hand-tuned A, lambda_, k and the artificial target blending
+    if CALIBRATE:
+        hand_error = calibration_error(pack_parameters(A, lambda_, k))[0]
+        A, lambda_, k, fitted_error = calibrate(workers=CALIBRATION_WORKERS)
+        target_nudges = {}
+        print(f"Calibration error: hand-tuned {hand_error:.4f} -> fitted {fitted_error:.4f} "
+              f"(lambda_={lambda_:.3f}, k={k:.3f})")
+        print(f"Calibrated A:\n{A.round(2)}")
 
-print("\n1990: Soviet Government still had certain power value {:.2f}, but Russia {:.2f} and USA {:.2f} began to rise.".format(
-    phi[0, t_50], phi[1, t_50], phi[3, t_50]))
-print("1991: Soviet Government almost lost power {:.2f}, Russia took the leading position {:.2f}, USA had the greatest influence {:.2f}.".format(
-    phi[0, t_150], phi[1, t_150], phi[3, t_150]))
+    # Numerical calculation (Euler method) - scenario forcings are compiled once into a dense table
+    forcing = scenario_forcing()
+    for t in range(T-1):
+        # Basic evolution
+        dphi = dt * (
+            -lambda_ * phi[:, t] * (phi[:, t]**2 - 1) +  # Non-linear term
+            (A @ phi[:, t] - np.diag(A) * phi[:, t]) +   # Diffusion term
+            0.005 * np.random.randn(N) +                 # Reduced noise
+            forcing[t]                                   # Fiscal shock, 1991 events, post-1990 trends
+        )
 
-# Display the graph
-plt.show()
+        # Update and ensure power is non-negative
+        phi[:, t+1] = np.maximum(phi[:, t] + dphi, 0)
+
+        if t in target_nudges:
+            weight, target = target_nudges[t]
+            phi[:, t+1] = (1 - weight) * phi[:, t+1] + weight * target
+
+    # Ensemble run: robustness of the 1990/1991 outcomes under the same noise model
+    if ENSEMBLE_SIZE:
+        ensemble_events = {
+            "Soviet Government power < 0.05 by 1991": (0, 'below', 0.05, 150),
+            "Russian Federation power > 0.5 by 1991": (1, 'above', 0.5, 150),
+            "Communist Party Conservatives power > 0.3 by 1991": (5, 'above', 0.3, 150),
+        }
+        bands, event_probabilities, _ = simulate_ensemble(ENSEMBLE_SIZE, events=ensemble_events)
+
+    # Adaptive run: the deterministic field on every plotted step, with dissolution-type events located
+    if ADAPTIVE:
+        adaptive_events = {
+            "Soviet Government power < 0.05": (0, 'below', 0.05),
+            "Russian Federation power > 0.5": (1, 'above', 0.5),
+        }
+        adaptive_phi, adaptive_event_years, adaptive_evaluations = integrate_adaptive(
+            grid=np.arange(T) * dt, events=adaptive_events)
+
+    # Visualization
+    plt.style.use('ggplot')
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), gridspec_kw={'height_ratios': [3, 1]})
+
+    # Title
+    fig.suptitle("Power Evolution During Soviet Union Dissolution (1985-1995)", fontsize=14, fontweight='bold', y=0.97)
+
+    # Power change chart
+    years = np.linspace(1985, 1995, T)
+    colors = ['#D62728', '#1F77B4', '#FF7F0E', '#2CA02C', '#9467BD', '#8C564B']
+
+    for i in range(N):
+        ax1.plot(years, phi[i, :], label=labels[i], color=colors[i], linewidth=2)
+        if ENSEMBLE_SIZE:
+            ax1.fill_between(years, bands[0, i], bands[-1, i], color=colors[i], alpha=0.15)
+        if ADAPTIVE:
+            ax1.plot(years, adaptive_phi[i, :], color=colors[i], linewidth=1, linestyle='--')
+
+    # Historical events
+    events = {1986.5: "Chernobyl", 1989: "Eastern Europe Changes", 1990: "Economic Crisis", 1991.17: "Soviet Dissolution", 1991.67: "CIS Formation"}
+    for year, event in events.items():
+        ax1.axvline(x=year, color='gray' if year != 1991.17 else 'red', linestyle='--', alpha=0.6)
+        ax1.text(year + 0.1, 0.85, event, rotation=90, alpha=0.7, fontsize=9)
+
+    ax1.set_ylabel("Power Index ϕi(t)", fontsize=10)
+    ax1.legend(loc='upper center', bbox_to_anchor=(0.5, -0.12), ncol=3, fontsize=9, frameon=True)
+    ax1.set_xlim(1985, 1995)
+    ax1.set_ylim(-0.1, 1.2)
+
+    # Mark key timepoints
+    ax1.plot(1990, phi[0, 50], 'o', color='black', markersize=5)
+    ax1.plot(1991.17, phi[0, 150], 'o', color='black', markersize=5)
+    ax1.text(1990, phi[0, 50]+0.05, f"({phi[0, 50]:.2f})", fontsize=8)
+    ax1.text(1991.17, phi[0, 150]+0.05, f"({phi[0, 150]:.2f})", fontsize=8)
+
+    # Fiscal impact chart
+    ax2.plot(years, k * fiscal_impact, color='darkred', linewidth=2)
+    ax2.fill_between(years, k * fiscal_impact, 0, color='darkred', alpha=0.2)
+    ax2.set_xlabel("Year", fontsize=10)
+    ax2.set_ylabel("Fiscal Impact", fontsize=10)
+    ax2.set_title("Soviet Fiscal Pressure Over Time", fontsize=11)
+    ax2.set_xlim(1985, 1995)
+
+    plt.tight_layout()
+    fig.subplots_adjust(hspace=0.2, top=0.92, bottom=0.15)
+
+    # Output key time point data
+    t_50 = 50  # 1990
+    t_150 = 150  # 1991 dissolution
+
+    print("\n===== Key Time Point Data =====")
+    print(f"1990 (t=50) Power Distribution: {phi[:, t_50].round(2)}")
+    print(f"1991 Dissolution (t=150) Power Distribution: {phi[:, t_150].round(2)}")
+
+    print("\n1990: Soviet Government still had certain power value {:.2f}, but Russia {:.2f} and USA {:.2f} began to rise.".format(
+        phi[0, t_50], phi[1, t_50], phi[3, t_50]))
+    print("1991: Soviet Government almost lost power {:.2f}, Russia took the leading position {:.2f}, USA had the greatest influence {:.2f}.".format(
+        phi[0, t_150], phi[1, t_150], phi[3, t_150]))
+
+    # Large-N run: the same dynamics with the core actors embedded in a sparse regional network
+    if SPARSE_ACTORS:
+        network, power = build_actor_network(SPARSE_ACTORS)
+        regional, recorded_steps = simulate_sparse(network, power, record_every=10)
+        print(f"\n===== Sparse Actor Network ({SPARSE_ACTORS} actors, {network.nnz} interactions) =====")
+        for label, step in (("1990 (t=50)", t_50), ("1991 (t=150)", t_150)):
+            column = np.searchsorted(recorded_steps, step)
+            print(f"{label} core actors: {regional[:N, column].round(2)} | "
+                  f"regional mean: {regional[N:, column].mean():.3f}")
+
+    if ADAPTIVE:
+        print(f"\n===== Adaptive Dormand-Prince ({adaptive_evaluations} drift evaluations, Euler used {T - 1}) =====")
+        for label, step in (("1990 (t=50)", t_50), ("1991 (t=150)", t_150)):
+            print(f"{label} Power Distribution: {adaptive_phi[:, step].round(2)}")
+        for name, event_years in adaptive_event_years.items():
+            print(f"{name}: {', '.join(f'{year:.2f}' for year in event_years) or 'never'}")
+
+    if ENSEMBLE_SIZE:
+        print(f"\n===== Monte Carlo Ensemble ({ENSEMBLE_SIZE} members) =====")
+        for label, step in (("1990 (t=50)", t_50), ("1991 (t=150)", t_150)):
+            print(f"{label} median: {bands[1, :, step].round(2)} | 5%: {bands[0, :, step].round(2)} | 95%: {bands[-1, :, step].round(2)}")
+        for name, probability in event_probabilities.items():
+            print(f"P({name}) = {probability:.3f}")
+
+    # Display the graph
+    plt.show()
 
 
 # Code Explanation
 
-1. Parameter Setup:
-    `N = 6`: Six actors.
-    `T = 200`: Simulation time steps, covering 1985-1995.
-    `lambda_ = 0.5`: Non-linear parameter.
-    `k = 0.2`: Fiscal bankruptcy impact coefficient.
+# 1. Parameter Setup:
+#     `N = 6`: Six actors.
+#     `T = 200`: Simulation time steps, covering 1985-1995.
+#     `lambda_ = 0.5`: Non-linear parameter.
+#     `k = 0.2`: Fiscal bankruptcy impact coefficient.
 
-2. Initial Conditions:
-    Soviet government initial value is 1, other actors are 0.1.
+# 2. Initial Conditions:
+#     Soviet government initial value is 1, other actors are 0.1.
 
-3. Adjacency Matrix A:
-    Using adjusted matrix, reflecting the negative impact of fiscal bankruptcy on the Soviet government.
+# 3. Adjacency Matrix A:
+#     Using adjusted matrix, reflecting the negative impact of fiscal bankruptcy on the Soviet government.
 
-4. Fiscal Bankruptcy F₁(t):
-    Defined as a piecewise function, simulating economic pressure increasing over time:
-     1985-1990: Slow increase.
-     1990-1991: Rapid deterioration.
-     After 1991: Stabilized at high negative value.
+# 4. Fiscal Bankruptcy F₁(t):
+#     Defined as a piecewise function, simulating economic pressure increasing over time:
+#      1985-1990: Slow increase.
+#      1990-1991: Rapid deterioration.
+#      After 1991: Stabilized at high negative value.
 
-5. Dynamics:
-    Using simplified first-order form: `dϕᵢ/dt = -λϕᵢ(ϕᵢ² - 1) + ∑ⱼ Aᵢⱼ(ϕⱼ - ϕᵢ) + Fᵢ + ηᵢ`.
-    Numerically integrated using the Euler method.
+# 5. Dynamics:
+#     Using simplified first-order form: `dϕᵢ/dt = -λϕᵢ(ϕᵢ² - 1) + ∑ⱼ Aᵢⱼ(ϕⱼ - ϕᵢ) + Fᵢ + ηᵢ`.
+#     Numerically integrated using the Euler method.
 
-6. Visualization:
-   - Plots each actor's power field ϕᵢ(t) changes over time.
-   - Marks key time points of 1990 and 1991 dissolution.
+# 6. Visualization:
+#    - Plots each actor's power field ϕᵢ(t) changes over time.
+#    - Marks key time points of 1990 and 1991 dissolution.
 
 # Numerical Analysis
 
-Power changes of main actors:
-Soviet Government (red): Starting from a high power level, rapidly declining to near 0 during the 1991 dissolution
-Russian Federation (blue): Rapidly rising after 1991 and stabilizing at a high position
-USA (green): Slowly strengthening over time, especially after 1991
-Eastern European Countries (purple): Slowly strengthening over time, similar trend to USA
-Communist Party Conservatives (orange): Brief rise around the 1991 dissolution, then rapidly declining and maintaining a low level
-Western European Allies (brown): Maintaining a medium power level with relatively small changes
-
-Key time point data:
-1990 (t=50): Although the Soviet government still dominated, its power had begun to decline, and other actors were slowly strengthening
-1991 Dissolution (t=150): A clear turning point, Soviet government power rapidly collapsed, Russian Federation and USA became the dominant forces
+# Power changes of main actors:
+# Soviet Government (red): Starting from a high power level, rapidly declining to near 0 during the 1991 dissolution
+# Russian Federation (blue): Rapidly rising after 1991 and stabilizing at a high position
+# USA (green): Slowly strengthening over time, especially after 1991
+# Eastern European Countries (purple): Slowly strengthening over time, similar trend to USA
+# Communist Party Conservatives (orange): Brief rise around the 1991 dissolution, then rapidly declining and maintaining a low level
+# Western European Allies (brown): Maintaining a medium power level with relatively small changes
+
+# Key time point data:
+# 1990 (t=50): Although the Soviet government still dominated, its power had begun to decline, and other actors were slowly strengthening
+# 1991 Dissolution (t=150): A clear turning point, Soviet government power rapidly collapsed, Russian Federation and USA became the dominant forces